@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+"""Performance benchmarks for the sudoku engine and the grid hot paths.
+
+Engine benchmarks (generation, solving, uniqueness checks, ...) only need
+sudokutools. UI benchmarks (SudokuGrid.sync, keystroke handling,
+selection moves, state save/restore) run headless: the app is replaced
+by a minimal App, which is never run, so no window is opened. Most of
+them call the handlers directly and field textures are rendered on the
+next frame, which never comes, so they measure the python side of the
+handlers. queued_actions goes through ActionManager.queue() and ticks
+the Clock like the main loop does (without waiting for the frame rate).
+UI benchmarks are skipped, if kivy isn't installed.
+
+Results are written as JSON to standard output. Every run is compared
+against the baseline committed as benchmarks/baseline.json (another
+file can be given with --baseline, an empty name skips the comparison):
+
+    python benchmarks/run.py
+    python benchmarks/run.py --baseline other.json
+
+A benchmark is flagged as regression, if its median time exceeds the
+baseline by more than --threshold (default: 20%). The exit status is 1,
+if there are regressions.
+
+Timings depend on the machine, so regenerate the baseline (on the
+machine the comparisons run on), whenever the benchmarks change or an
+intended slowdown is accepted:
+
+    python benchmarks/run.py --baseline "" --save benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# puzzles of increasing difficulty
+PUZZLES = (
+    "003020600900305001001806400008102900700000008006708200002609500"
+    "800203009005010300",
+    "100000569492056108056109240009640801064010000218035604040500016"
+    "905061402621000005",
+    "000000010400000000020000000000050407008000300001090000300400200"
+    "050100000000806000",
+    "800000000003600000070090200050007000000045700000100030001000068"
+    "008500010090000400",
+)
+
+BENCHMARKS = []
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+def benchmark(name, group="engine", number=10, rounds=5):
+    """Register a benchmark.
+
+    The decorated function does the setup and returns the function to
+    time, which is called number times per round.
+    """
+    def decorator(setup):
+        BENCHMARKS.append((name, group, number, rounds, setup))
+        return setup
+    return decorator
+
+
+def measure(func, number, rounds):
+    """Return the per-call times (in seconds) of all rounds."""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def boards():
+    from sudokulib.board import decode
+    return [decode(s) for s in PUZZLES]
+
+
+# engine
+
+@benchmark("generate", number=2, rounds=3)
+def bench_generate():
+    from sudokutools.generate import generate
+    random.seed(0)
+    return lambda: generate(min_count=30)
+
+
+@benchmark("solve")
+def bench_solve():
+    from sudokulib.solver import solve_board
+    puzzles = boards()
+    return lambda: [solve_board(board) for board in puzzles]
+
+
+@benchmark("count_solutions")
+def bench_count_solutions():
+    from sudokulib.solver import count_solutions
+    puzzles = boards()
+    return lambda: [count_solutions(board, 2) for board in puzzles]
+
+
+@benchmark("make_unique", number=3)
+def bench_make_unique():
+    from sudokulib.solver import make_unique, solve_board
+    rng = random.Random(0)
+    board = solve_board(boards()[0])
+    for i in rng.sample(range(81), 60):
+        board[i] = 0
+    return lambda: make_unique(board)
+
+
+@benchmark("rate")
+def bench_rate():
+    from sudokulib.rating import rate
+    puzzles = boards()
+    return lambda: [rate(board) for board in puzzles]
+
+
+@benchmark("canonical_form")
+def bench_canonical_form():
+    from sudokulib.symmetry import canonical_form
+    puzzles = boards()
+    return lambda: [canonical_form(board) for board in puzzles]
+
+
+@benchmark("cached_solve")
+def bench_cached_solve():
+    from sudokulib.cache import SolutionCache
+    cache = SolutionCache()
+    puzzles = boards()
+    for board in puzzles:
+        cache.solve(board)
+    return lambda: [cache.solve(board) for board in puzzles]
+
+
+@benchmark("history_seek", number=100)
+def bench_history_seek():
+    from sudokulib.board import ALL
+    from sudokulib.history import History
+    rng = random.Random(0)
+    history = History([0] * 81)
+    for _ in range(1000):
+        i = rng.randrange(81)
+        history.record([(i, history.cells[i], rng.randint(-ALL, 9))])
+    positions = [rng.randrange(1001) for _ in range(100)]
+    return lambda: [history.seek(p) for p in positions]
+
+
+# ui
+
+class HeadlessApp(object):
+    """Create a minimal running app with the screens of SudokuApp."""
+
+    def __init__(self, directory):
+        from kivy.app import App
+        from kivy.config import ConfigParser
+        from kivy.lang import Builder
+
+        from sudokulib.action import ActionManager
+        from sudokulib.cache import SolutionCache
+        from sudokulib.journal import Journal
+        from sudokulib.screen import GameScreen, LazyScreenManager
+        from kivy.factory import Factory
+
+        # needed by the kv files (the canvas renderer needs a window)
+        from sudokulib.grid import SudokuGrid
+        Factory.register("ConfiguredGrid", cls=SudokuGrid)
+
+        class BenchApp(App):
+            __events__ = list(App.__events__) + ['on_settings_change']
+
+            def on_settings_change(self, section, key, value):
+                pass
+
+            def append_journal(self, key, entry):
+                self.journal.append(key, entry)
+
+        for name in ("sudoku.kv", "game.kv", "custom.kv"):
+            Builder.load_file(os.path.join(ROOT, "kv", name))
+
+        app = BenchApp()
+        app.config = ConfigParser(name="benchmark")
+        with open(os.path.join(ROOT, "settings.json")) as f:
+            for setting in json.load(f):
+                if setting["type"] != "title":
+                    app.config.setdefaults(
+                        setting["section"],
+                        {setting["key"]: setting["default"]})
+        app.bank = None
+        app.supply = None
+        app.cache = SolutionCache()
+        app.journal = Journal(os.path.join(directory, "state.json"),
+                              os.path.join(directory, "state.journal"))
+        App._running_app = app
+
+        app.screens = LazyScreenManager()
+        self.game = GameScreen()
+        app.screens.add_widget(self.game)
+
+        # dispatches queued actions to the current screen like SudokuApp
+        app.actions = ActionManager()
+        app.actions.bind(on_action=lambda manager, action:
+                         app.screens.current_screen.on_action(action))
+        self.app = app
+
+    def start_game(self, puzzle):
+        from sudokulib.board import decode, to_sudoku
+        orig = to_sudoku(decode(puzzle))
+        self.game.new_game(orig, orig.copy())
+        return self.game
+
+
+def headless():
+    """Return the HeadlessApp (created on first use)."""
+    if not hasattr(headless, "app"):
+        headless.app = HeadlessApp(tempfile.mkdtemp(prefix="sudoku-bench"))
+    return headless.app
+
+
+@benchmark("grid_sync_full", group="ui", number=20)
+def bench_grid_sync_full():
+    from sudokulib.board import decode, to_sudoku
+    from sudokulib.solver import solve_board
+    game = headless().start_game(PUZZLES[2])
+    sudokus = [to_sudoku(decode(PUZZLES[2])),
+               to_sudoku(solve_board(decode(PUZZLES[2])))]
+
+    def sync():
+        game.grid.sync(sudokus[0])
+        game.grid.sync(sudokus[1])
+    return sync
+
+
+@benchmark("grid_sync_one", group="ui", number=2000)
+def bench_grid_sync_one():
+    from sudokulib.board import decode, to_sudoku
+    game = headless().start_game(PUZZLES[2])
+    sudoku = to_sudoku(decode(PUZZLES[2]))
+    coords = [(0, 0)]
+
+    def sync():
+        sudoku.set_number(0, 0, 5 if not sudoku[0, 0] else 0)
+        game.grid.sync(sudoku, coords)
+    return sync
+
+
+@benchmark("keystroke", group="ui", number=200)
+def bench_keystroke():
+    game = headless().start_game(PUZZLES[2])
+    game.grid.fields[(0, 0)].select()
+    keys = [str(n) for n in range(1, 10)]
+
+    def press():
+        for key in keys:
+            game.on_action(key)
+    return press
+
+
+@benchmark("select_move", group="ui", number=200)
+def bench_select_move():
+    game = headless().start_game(PUZZLES[2])
+    game.grid.fields[(0, 0)].select()
+    moves = ["next_field"] * 8 + ["next_row"] * 8
+
+    def move():
+        for action in moves:
+            game.on_action(action)
+    return move
+
+
+@benchmark("queued_actions", group="ui", number=100)
+def bench_queued_actions():
+    from kivy.clock import Clock
+    app = headless()
+    app.start_game(PUZZLES[2]).grid.fields[(0, 0)].select()
+    # one frame: keys queued by the keyboard, drained by the Clock
+    frame = ["1", "2", "next_field", "3", "confirm", "next_row"]
+
+    def tick():
+        for action in frame:
+            app.app.actions.queue(action)
+        Clock.tick()
+        Clock.tick_draw()
+    return tick
+
+
+@benchmark("save_restore", group="ui", number=20)
+def bench_save_restore():
+    from sudokulib.journal import DictStore
+    game = headless().start_game(PUZZLES[2])
+    game.grid.fields[(0, 0)].select()
+    for action in ("1", "2", "next_field", "3", "confirm") * 20:
+        game.on_action(action)
+
+    def save_restore():
+        store = DictStore()
+        game.save_state(store)
+        game.restore_state(store)
+    return save_restore
+
+
+def run(names=None, groups=None):
+    """Run the benchmarks and return the results as dict."""
+    results = {}
+    for name, group, number, rounds, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        if groups and group not in groups:
+            continue
+
+        try:
+            func = setup()
+        except ImportError as e:
+            sys.stderr.write("Skipping %s: %s\n" % (name, e))
+            continue
+
+        times = sorted(measure(func, number, rounds))
+        results[name] = {
+            "group": group,
+            "number": number,
+            "rounds": rounds,
+            "min": times[0],
+            "median": times[len(times) // 2],
+            "max": times[-1],
+        }
+        sys.stderr.write("%-16s %10.3f ms\n" % (
+            name, results[name]["median"] * 1000))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the names of benchmarks slower than baseline."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        result["baseline_ratio"] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+            sys.stderr.write("REGRESSION %s: %.2fx slower than baseline\n"
+                             % (name, ratio))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run the sudoku performance benchmarks.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run")
+    parser.add_argument("--group", action="append", dest="groups",
+                        choices=("engine", "ui"),
+                        help="run only benchmarks of this group")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="compare to this result file (default: "
+                             "benchmarks/baseline.json, \"\" to skip)")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown (default: 0.2 = 20%%)")
+    parser.add_argument("--save", help="write the results to this file")
+    args = parser.parse_args(args)
+
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+    os.environ.setdefault("KIVY_NO_FILELOG", "1")
+    # Clock.tick() must not sleep until the next frame
+    os.environ.setdefault("KCFG_GRAPHICS_MAXFPS", "0")
+
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.time(),
+        "results": run(args.names, args.groups),
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(data["results"], baseline, args.threshold)
+        data["regressions"] = regressions
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    json.dump(data, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,24 +2,51 @@
 # -*- coding: utf-8 -*-
 
 # standard imports
+from functools import partial
 import json
-from os.path import join
+from os.path import exists, join
+from shutil import copyfile
+import time
 
 # kivy imports
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.config import Config
+from kivy.factory import Factory
 from kivy.lang import Builder
 from kivy.logger import Logger
-from kivy.storage.jsonstore import JsonStore
-from kivy.uix.screenmanager import ScreenManager, FadeTransition
+from kivy.uix.screenmanager import FadeTransition
 
+from sudokulib import trace
 from sudokulib.action import ActionManager
-from sudokulib.screen import CustomScreen, GameScreen, MenuScreen
+from sudokulib.bank import PuzzleBank
+from sudokulib.cache import SolutionCache
+from sudokulib.canvasgrid import CanvasGrid
+from sudokulib.journal import DictStore, Journal
+from sudokulib.screen import CustomScreen, GameScreen, LazyScreenManager, \
+    MenuScreen
+from sudokulib.supply import PuzzleSupply
 # needed by sudoku.kv
 from sudokulib.grid import SudokuGrid
 
+# grid classes used as ConfiguredGrid in the kv files (setting "renderer")
+GRID_RENDERERS = {
+    "fields": SudokuGrid,
+    "canvas": CanvasGrid,
+}
+
+
+# screens, whose state is saved
+SCREENS = (GameScreen, CustomScreen)
 
 STATEFILE = "state.json"
+JOURNALFILE = "state.journal"
+# seconds between writes of the journal to disk
+JOURNAL_SYNC_INTERVAL = 1.0
+# number of journal entries, which trigger a new snapshot
+JOURNAL_COMPACT_SIZE = 500
+BANKFILE = "puzzles.bank"
+CACHEFILE = "solutions.cache"
 
 
 class SudokuApp(App):
@@ -27,17 +54,38 @@ class SudokuApp(App):
     __events__.append('on_settings_change')
 
     def build(self):
+        self.start_time = time.time()
         self.use_kivy_settings = True
 
         self.actions = ActionManager()
+        self.supply = PuzzleSupply()
+        self.state = DictStore()
+        self.cache = self.open_cache()
 
-        self.screens = ScreenManager(transition=FadeTransition())
+        renderer = self.config.get("visuals", "renderer")
+        Factory.register("ConfiguredGrid", cls=GRID_RENDERERS.get(
+            renderer, SudokuGrid))
+        Logger.info("SudokuApp: Using the %s grid renderer." % renderer)
+
+        # only the first screen is built now, the others on first use
+        self.screens = LazyScreenManager(transition=FadeTransition())
         # self.screens.add_widget(MenuScreen())
         self.screens.add_widget(GameScreen())
-        self.screens.add_widget(CustomScreen())
+        self.screens.register(
+            "custom", partial(self.build_screen, CustomScreen))
+        self.actions.bind(on_action=self._on_action)
 
         return self.screens
 
+    def _on_action(self, manager, action):
+        self.screens.current_screen.on_action(action)
+
+    def build_screen(self, cls):
+        """Build a screen of type cls and restore its state."""
+        screen = cls()
+        screen.restore_state(self.state)
+        return screen
+
     def __read_default_settings(self):
         defaults = {}
 
@@ -69,32 +117,123 @@ class SudokuApp(App):
         # default handler (required)
         pass
 
+    def open_bank(self):
+        """Open the puzzle bank in user_data_dir or return None.
+
+        A bank shipped with the app is copied to user_data_dir first,
+        since played sudokus are marked within the bank file.
+        """
+        filename = join(self.user_data_dir, BANKFILE)
+        try:
+            if not exists(filename) and exists(BANKFILE):
+                copyfile(BANKFILE, filename)
+            bank = PuzzleBank(filename)
+        except (IOError, OSError, ValueError) as e:
+            Logger.info("SudokuApp: No puzzle bank available: %s" % e)
+            return None
+
+        Logger.info("SudokuApp: Opened puzzle bank %s (%d sudokus)." % (
+            filename, bank.records))
+        return bank
+
+    def open_cache(self):
+        """Return the SolutionCache stored in user_data_dir (or kept in
+        memory only, if the file can't be opened).
+        """
+        filename = join(self.user_data_dir, CACHEFILE)
+        try:
+            return SolutionCache(filename)
+        except (IOError, OSError, ValueError) as e:
+            Logger.info("SudokuApp: Solution cache kept in memory: %s" % e)
+            return SolutionCache()
+
     def restore_state(self):
         filename = join(self.user_data_dir, STATEFILE)
-        store = JsonStore(filename)
         Logger.info("SudokuApp: Restoring state from %s." % filename)
+        state, entries = self.journal.load()
+        self.state = DictStore(state)
+
+        for cls in SCREENS:
+            cls.replay(self.state, entries)
+
+        if entries:
+            Logger.info("SudokuApp: Replayed %d journal entries." % len(
+                entries))
+            # Restoring the screens appends to the journal, which starts
+            # a new one, so the replayed state must be on disk first.
+            self.journal.snapshot(self.state.data)
 
         for name in self.screens.screen_names:
             screen = self.screens.get_screen(name)
-            screen.restore_state(store)
+            screen.restore_state(self.state)
 
     def save_state(self):
-        filename = join(self.user_data_dir, STATEFILE)
-        store = JsonStore(filename)
+        """Write a snapshot of all screens and start a new journal."""
+        self.__compaction = None
+        # keep the state of screens, which haven't been built
+        store = DictStore(dict(self.state.data))
 
         for name in self.screens.screen_names:
             screen = self.screens.get_screen(name)
             screen.save_state(store)
 
+        self.journal.snapshot(store.data)
+        self.state = store
+
+    def append_journal(self, key, entry):
+        """Record a change of the state stored under key."""
+        self.journal.append(key, entry)
+
+        if self.journal.entries >= JOURNAL_COMPACT_SIZE and \
+                not self.__compaction:
+            self.__compaction = Clock.schedule_once(
+                lambda dt: self.save_state())
+
+    def _sync_journal(self, dt):
+        self.journal.flush()
+
     def on_start(self):
+        self.journal = Journal(
+            join(self.user_data_dir, STATEFILE),
+            join(self.user_data_dir, JOURNALFILE))
+        self.__compaction = None
+        self.bank = self.open_bank()
         self.restore_state()
+        Clock.schedule_interval(self._sync_journal, JOURNAL_SYNC_INTERVAL)
+        Clock.schedule_once(self._on_first_frame)
+        if trace.enabled:
+            Logger.info("SudokuApp: Tracing to %s." % trace.TRACE_FILE)
+            Clock.schedule_interval(trace.tracer.frame, 0)
+
+    def _on_first_frame(self, dt):
+        Logger.info("SudokuApp: Started in %.3f seconds." % (
+            time.time() - self.start_time))
+        # don't compete with the startup for the GIL
+        self.supply.start()
 
     def on_pause(self):
-        self.save_state()
+        self.journal.flush()
         return True
 
     def on_stop(self):
+        self.supply.stop()
         self.save_state()
+        self.journal.close()
+        if self.bank:
+            self.bank.close()
+        Logger.info("SudokuApp: Solution cache: %d hits, %d misses." % (
+            self.cache.hits, self.cache.misses))
+        self.cache.close()
+        if trace.enabled:
+            self.__write_trace()
+
+    def __write_trace(self):
+        trace.tracer.export(trace.TRACE_FILE)
+        Logger.info("SudokuApp: Wrote trace to %s. Slowest handlers:"
+                    % trace.TRACE_FILE)
+        for name, calls, mean, longest in trace.tracer.summary():
+            Logger.info("SudokuApp:   %-32s %6d calls, mean %7.3f ms, "
+                        "max %7.3f ms" % (name, calls, mean, longest))
 
 
 if __name__ == '__main__':
@@ -4,6 +4,11 @@ The ActionManager dispatches events of type 'on_action'.
 A action is a simple string, which is dispatched, when certain keyboard
 inputs (as defined in KEYBOARD_ACTIONS) are registered.
 
+Actions are queued and dispatched once per frame (before it's drawn).
+Consecutive navigation actions or consecutive digits are dispatched
+together as a tuple of actions (see coalesce()), so handlers can apply
+them with a single update, e.g. one selection change for a held arrow key.
+
 KEYBOARD_ACTIONS is a a dictionary, which maps (keyname, modifiers) pairs
 to action strings. E.g. the entry ("space", ()): "fire" will dispatch a
 "fire" action, if space (without modifiers) is pressed.
@@ -28,18 +33,23 @@ the ActionManager:
             app.actions.bind(on_action=self.on_action)
 
         def on_action(self, manager, action):
-            pass
+            if isinstance(action, tuple):
+                pass  # several navigation actions or digits
+            else:
+                pass
 
 Note: If you're using screens, please be aware, that actions are send to
 all running screens.
 """
 
-from collections import namedtuple
-
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.event import EventDispatcher
 from kivy.core.window import Window
 
+from sudokulib.board import MOVES
+from sudokulib.trace import traced
+
 KEYBOARD_ACTIONS = {
     ("numpad0", ()): "0",
     ('numpad1', ()): "1",
@@ -68,12 +78,56 @@ KEYBOARD_ACTIONS = {
     ('numpadenter', ()): "confirm",
     ('enter', ()): "confirm",
 
+    ('z', ('ctrl', )): "undo",
+    ('y', ('ctrl', )): "redo",
+    ('h', ()): "hint",
+
     ('right', ()): "next_field",
     ('left', ()): "prev_field",
     ('down', ()): "next_row",
     ('up', ()): 'prev_row',
 }
 
+NAVIGATION_ACTIONS = frozenset(MOVES)
+DIGIT_ACTIONS = frozenset(str(n) for n in range(10))
+
+
+def coalesce(actions):
+    """Group consecutive navigation actions and consecutive digits.
+
+    Returns:
+        list: The actions in order, runs of at least two navigation
+              actions or digits are replaced by a tuple of the run.
+    """
+    batches = []
+    run = []
+    kind = None
+
+    for action in actions:
+        if action in NAVIGATION_ACTIONS:
+            current = NAVIGATION_ACTIONS
+        elif action in DIGIT_ACTIONS:
+            current = DIGIT_ACTIONS
+        else:
+            current = None
+
+        if current is not None and current is kind:
+            run.append(action)
+            continue
+
+        if run:
+            batches.append(run[0] if len(run) == 1 else tuple(run))
+        if current is None:
+            batches.append(action)
+            run = []
+        else:
+            run = [action]
+        kind = current
+
+    if run:
+        batches.append(run[0] if len(run) == 1 else tuple(run))
+    return batches
+
 
 class ActionManager(EventDispatcher):
     __events__ = ('on_action', )
@@ -83,6 +137,10 @@ class ActionManager(EventDispatcher):
         """
         super(ActionManager, self).__init__(**kwargs)
 
+        self.__queue = []
+        # -1: drain after the input of the frame, before it's drawn
+        self.__trigger_drain = Clock.create_trigger(self._drain, -1)
+
         app = App.get_running_app()
 
         self.keyboard = Window.request_keyboard(
@@ -93,15 +151,28 @@ class ActionManager(EventDispatcher):
         # Not closing the keyboard - we still need it.
         pass
 
+    @traced("ActionManager.on_keyboard", "input")
     def on_keyboard(self, keyboard, keycode, text, modifiers):
-        """Dispatch an on_action event,
+        """Queue an action,
         if the provided input matches an action in KEYBOARD_ACTIONS.
         """
         keyname = keycode[1]
 
         name = KEYBOARD_ACTIONS.get((keyname, tuple(modifiers)), None)
         if name:
-            self.dispatch('on_action', name)
+            self.queue(name)
+
+    def queue(self, action):
+        """Dispatch action with the other actions of this frame."""
+        self.__queue.append(action)
+        self.__trigger_drain()
+
+    @traced("ActionManager.drain", "input")
+    def _drain(self, dt):
+        actions = coalesce(self.__queue)
+        self.__queue = []
+        for action in actions:
+            self.dispatch('on_action', action)
 
     def on_action(self, action):
         """default handler (required)"""
@@ -0,0 +1,319 @@
+"""Module that provides a memory-mapped on-disk bank of sudokus.
+
+A bank stores a large number of pre-generated sudokus together with their
+solutions in a single file, which is accessed via mmap. Opening a bank
+costs almost no memory or time, regardless of its size, and drawing a
+random unplayed sudoku of a given level takes constant time.
+
+File layout (all integers are little-endian uint32):
+
+    header:  magic (b"SDKB"), version, number of levels, number of records
+    levels:  (start, count, unplayed) for every level
+    order:   one record number per record
+    played:  one bit per record
+    records: RECORD_SIZE bytes per record
+
+Records are grouped by level: level i owns the records
+start ... start + count - 1. The first `unplayed` entries of a level's
+range in `order` are the record numbers of its unplayed sudokus.
+Drawing picks one of them at random, swaps it behind the unplayed
+entries and marks it in the played bitmap.
+
+Each record packs the solution as 81 4-bit numbers (41 bytes) followed by
+a bitmap of the given fields (11 bytes).
+
+Usage:
+
+    bank = PuzzleBank("puzzles.bank")
+    puzzle, solution = bank.draw("easy")
+    bank.close()
+
+A bank can be built from the command line:
+
+    python -m sudokulib.bank build puzzles.bank --count 1000
+"""
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+import tempfile
+from multiprocessing import Pool
+
+from sudokutools.generate import generate
+from sudokutools.solvers import solve
+
+from sudokulib.board import INDICES, to_board, to_sudoku
+from sudokulib.rating import rate
+
+MAGIC = b"SDKB"
+VERSION = 1
+
+# level name -> min_count argument for generate()
+# (generated sudokus are kept, if sudokulib.rating rates them as the level)
+LEVELS = (
+    ("easy", 36),
+    ("medium", 0),
+    ("hard", 0),
+)
+LEVEL_NAMES = tuple(name for (name, _) in LEVELS)
+
+HEADER = struct.Struct("<4sIII")
+LEVEL = struct.Struct("<III")
+ORDER = struct.Struct("<I")
+
+SOLUTION_SIZE = 41
+GIVENS_SIZE = 11
+RECORD_SIZE = SOLUTION_SIZE + GIVENS_SIZE
+
+
+def pack_record(puzzle, solution):
+    """Pack the boards puzzle and solution into a record (bytes)."""
+    data = bytearray(RECORD_SIZE)
+    for i in INDICES:
+        data[i >> 1] |= solution[i] << ((i & 1) * 4)
+        if puzzle[i]:
+            data[SOLUTION_SIZE + (i >> 3)] |= 1 << (i & 7)
+    return bytes(data)
+
+
+def unpack_record(data):
+    """Return the (puzzle, solution) boards stored in a record."""
+    solution = [(data[i >> 1] >> ((i & 1) * 4)) & 0xf for i in INDICES]
+    puzzle = [
+        solution[i] if data[SOLUTION_SIZE + (i >> 3)] & (1 << (i & 7)) else 0
+        for i in INDICES]
+    return puzzle, solution
+
+
+class PuzzleBank(object):
+    def __init__(self, filename):
+        """Open the bank stored in filename.
+
+        Raises:
+            IOError:    if the file can't be opened.
+            ValueError: if the file is not a valid bank.
+        """
+        self.filename = filename
+        self.__file = open(filename, "r+b")
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0)
+        except (ValueError, mmap.error):
+            self.__file.close()
+            raise ValueError("%s is not a valid puzzle bank." % filename)
+
+        magic, version, levels, records = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a valid puzzle bank." % filename)
+
+        self.levels = levels
+        self.records = records
+        self.__levels_offset = HEADER.size
+        self.__order_offset = self.__levels_offset + levels * LEVEL.size
+        self.__played_offset = self.__order_offset + records * ORDER.size
+        self.__records_offset = self.__played_offset + (records + 7) // 8
+
+        if len(self.__map) != self.__records_offset + records * RECORD_SIZE:
+            self.close()
+            raise ValueError("%s is truncated." % filename)
+
+    def close(self):
+        self.__map.flush()
+        self.__map.close()
+        self.__file.close()
+
+    def __level_index(self, level):
+        if level in LEVEL_NAMES:
+            level = LEVEL_NAMES.index(level)
+        if not 0 <= level < self.levels:
+            raise KeyError(level)
+        return level
+
+    def __get_level(self, index):
+        return LEVEL.unpack_from(
+            self.__map, self.__levels_offset + index * LEVEL.size)
+
+    def __set_unplayed(self, index, unplayed):
+        offset = self.__levels_offset + index * LEVEL.size
+        start, count, _ = LEVEL.unpack_from(self.__map, offset)
+        LEVEL.pack_into(self.__map, offset, start, count, unplayed)
+
+    def __get_order(self, pos):
+        return ORDER.unpack_from(
+            self.__map, self.__order_offset + pos * ORDER.size)[0]
+
+    def __set_order(self, pos, record):
+        ORDER.pack_into(
+            self.__map, self.__order_offset + pos * ORDER.size, record)
+
+    def count(self, level):
+        """Return (unplayed, total) number of sudokus in level."""
+        start, count, unplayed = self.__get_level(self.__level_index(level))
+        return unplayed, count
+
+    def played(self, record):
+        """Return, if the sudoku in record has been drawn already."""
+        offset = self.__played_offset + (record >> 3)
+        return bool(self.__map[offset] & (1 << (record & 7)))
+
+    def __set_played(self, record, played):
+        offset = self.__played_offset + (record >> 3)
+        if played:
+            self.__map[offset] |= 1 << (record & 7)
+        else:
+            self.__map[offset] &= ~(1 << (record & 7)) & 0xff
+
+    def get(self, record):
+        """Return the (puzzle, solution) boards stored in record."""
+        offset = self.__records_offset + record * RECORD_SIZE
+        return unpack_record(self.__map[offset:offset + RECORD_SIZE])
+
+    def draw(self, level):
+        """Return a random unplayed (puzzle, solution) pair from level.
+
+        The pair is marked as played. Returns None, if every sudoku of
+        level has been played already.
+
+        Args:
+            level (str or int): Level name (see LEVEL_NAMES) or index.
+        """
+        index = self.__level_index(level)
+        start, count, unplayed = self.__get_level(index)
+        if not unplayed:
+            return None
+
+        # swap the chosen record behind the unplayed ones
+        pos = start + random.randrange(unplayed)
+        last = start + unplayed - 1
+        record = self.__get_order(pos)
+        self.__set_order(pos, self.__get_order(last))
+        self.__set_order(last, record)
+        self.__set_unplayed(index, unplayed - 1)
+
+        self.__set_played(record, True)
+
+        puzzle, solution = self.get(record)
+        return to_sudoku(puzzle), to_sudoku(solution)
+
+    def reset(self, level):
+        """Mark all sudokus in level as unplayed."""
+        index = self.__level_index(level)
+        start, count, _ = self.__get_level(index)
+        for record in range(start, start + count):
+            self.__set_played(record, False)
+        self.__set_unplayed(index, count)
+        self.__map.flush()
+
+
+def generate_record(level):
+    """Generate a sudoku of level (a (name, min_count) pair from LEVELS)
+    and return it packed as a record together with its solution.
+
+    Sudokus are generated with at least min_count numbers, until one is
+    rated as the level.
+    """
+    name, min_count = level
+    while True:
+        puzzle = generate(min_count=min_count)
+        board = to_board(puzzle)
+        if rate(board).level == name:
+            return pack_record(board, to_board(solve(puzzle)))
+
+
+def build(filename, counts, processes=None, report=lambda level, n: None):
+    """Build a new bank in filename from the sudokutools generator.
+
+    Args:
+        filename (str):     Name of the bank file (overwritten if present).
+        counts (list):      Number of sudokus for each level in LEVELS.
+        processes (int):    Number of generator processes
+                            (defaults to the number of cpus).
+        report (function):  Called with (level name, generated count).
+    """
+    pool = Pool(processes)
+    parts = []
+
+    try:
+        for level, count in zip(LEVELS, counts):
+            name = level[0]
+            part = tempfile.TemporaryFile()
+            records = pool.imap_unordered(
+                generate_record, [level] * count, chunksize=4)
+            for n, record in enumerate(records, 1):
+                part.write(record)
+                report(name, n)
+            parts.append((part, count))
+    finally:
+        pool.terminate()
+
+    total = sum(counts)
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(parts), total))
+
+        start = 0
+        for _, count in parts:
+            f.write(LEVEL.pack(start, count, count))
+            start += count
+
+        for record in range(total):
+            f.write(ORDER.pack(record))
+        f.write(b"\0" * ((total + 7) // 8))
+
+        for part, _ in parts:
+            part.seek(0)
+            while True:
+                data = part.read(RECORD_SIZE * 4096)
+                if not data:
+                    break
+                f.write(data)
+            part.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sudokulib.bank",
+        description="Build a sudoku bank from the sudokutools generator.")
+    subparsers = parser.add_subparsers(dest="command")
+    build_parser = subparsers.add_parser("build", help="build a new bank")
+    build_parser.add_argument("filename")
+    build_parser.add_argument(
+        "--count", type=int, default=100,
+        help="number of sudokus per level (default: 100)")
+    for name in LEVEL_NAMES:
+        build_parser.add_argument(
+            "--%s" % name, type=int, default=None,
+            help="number of %s sudokus (overrides --count)" % name)
+    build_parser.add_argument(
+        "--processes", type=int, default=None,
+        help="number of generator processes (default: number of cpus)")
+    info_parser = subparsers.add_parser("info", help="show bank statistics")
+    info_parser.add_argument("filename")
+
+    args = parser.parse_args(args)
+
+    if args.command == "build":
+        counts = [getattr(args, name) for name in LEVEL_NAMES]
+        counts = [args.count if c is None else c for c in counts]
+
+        def report(level, n):
+            sys.stderr.write("\r%s: %d" % (level, n))
+            sys.stderr.flush()
+
+        build(args.filename, counts, processes=args.processes, report=report)
+        sys.stderr.write("\n")
+    elif args.command == "info":
+        bank = PuzzleBank(args.filename)
+        for name in LEVEL_NAMES[:bank.levels]:
+            print("%s: %d of %d unplayed" % ((name, ) + bank.count(name)))
+        bank.close()
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
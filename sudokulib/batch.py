@@ -0,0 +1,141 @@
+"""Headless batch solver (doesn't import kivy).
+
+Reads sudokus (one line of 81 digits, '.' or '0' for empty fields) from a
+file or standard input, solves them in a pool of processes with the
+solver of the app (see sudokulib.solver) and writes one line per sudoku
+to standard output in input order:
+
+ * the solution as 81 digits,
+ * "unsolvable", if the sudoku has no solution,
+ * "timeout", if solving exceeded the time budget or
+ * "invalid line N", if input line N is not a sudoku.
+
+Empty input lines are skipped, every other line gets an output line.
+
+Finally the throughput and latency percentiles are written to standard
+error.
+
+Usage:
+
+    python -m sudokulib.batch puzzles.txt > solutions.txt
+    cat puzzles.txt | python -m sudokulib.batch --processes 4
+"""
+
+import argparse
+from collections import namedtuple
+import sys
+import time
+from functools import partial
+
+from sudokulib.board import encode, read_boards
+from sudokulib.parallel import CHUNKSIZE, map_chunked
+from sudokulib.solver import SearchTimeout, solve_board
+
+PERCENTILES = (50, 90, 99)
+
+
+class InvalidLine(namedtuple("InvalidLineTuple", ["number", "error"])):
+    """Placeholder for an input line, which is not a sudoku."""
+    pass
+
+
+def solve_timed(board, timeout=None):
+    """Solve board and return (result, seconds).
+
+    result is the solution (a board), "unsolvable", "timeout" or
+    "invalid line N" (if board is an InvalidLine).
+    """
+    if isinstance(board, InvalidLine):
+        return "invalid line %d" % board.number, 0.0
+
+    start = time.time()
+    try:
+        result = solve_board(board, timeout=timeout)
+    except SearchTimeout:
+        result = "timeout"
+    else:
+        if result is None:
+            result = "unsolvable"
+    return result, time.time() - start
+
+
+def percentile(values, p):
+    """Return the p-th percentile of the sorted list values."""
+    if not values:
+        return 0.0
+    k = int(round(p / 100.0 * (len(values) - 1)))
+    return values[k]
+
+
+def solve_stream(boards, processes=None, chunksize=CHUNKSIZE, timeout=None):
+    """Solve boards (an iterable) in a pool of processes.
+
+    Yields:
+        (board, result, seconds) triples in input order
+        (see solve_timed()).
+    """
+    func = partial(solve_timed, timeout=timeout)
+    for board, (result, seconds) in map_chunked(
+            func, boards, processes, chunksize):
+        yield board, result, seconds
+
+
+def report(latencies, elapsed, out=sys.stderr):
+    """Write throughput and latency percentiles to out."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    out.write("%d sudokus in %.3f s (%.1f sudokus/s)\n" % (
+        count, elapsed, count / elapsed if elapsed else 0.0))
+    out.write("latency: %s, max %.2f ms\n" % (
+        ", ".join("p%d %.2f ms" % (p, percentile(latencies, p) * 1000)
+                  for p in PERCENTILES),
+        (latencies[-1] if latencies else 0.0) * 1000))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sudokulib.batch",
+        description="Solve sudokus (one line of 81 digits per sudoku, "
+                    "'.' may be used for empty fields).")
+    parser.add_argument(
+        "filename", nargs="?", default="-",
+        help="file to read (default: standard input)")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="number of processes (default: number of cpus)")
+    parser.add_argument(
+        "--chunksize", type=int, default=CHUNKSIZE,
+        help="sudokus sent to a process at once (default: %d)" % CHUNKSIZE)
+    parser.add_argument(
+        "--timeout", type=float, default=None,
+        help="time budget per sudoku in seconds (default: no limit)")
+    args = parser.parse_args(args)
+
+    f = sys.stdin if args.filename == "-" else open(args.filename)
+
+    def invalid(number, error):
+        sys.stderr.write("Invalid line %d: %s\n" % (number, error))
+        return InvalidLine(number, str(error))
+
+    latencies = []
+    start = time.time()
+    try:
+        for board, result, seconds in solve_stream(
+                read_boards(f, invalid), args.processes, args.chunksize,
+                args.timeout):
+            sys.stdout.write(
+                (result if isinstance(result, str) else encode(result)) +
+                "\n")
+            if not isinstance(board, InvalidLine):
+                latencies.append(seconds)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    sys.stdout.flush()
+    report(latencies, time.time() - start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
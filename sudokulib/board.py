@@ -0,0 +1,199 @@
+"""Helpers to convert between Sudoku instances and flat boards.
+
+A board is a list of 81 ints (0 representing an empty field), indexed by
+x + y * 9. This is the same order SudokuGrid uses for its fields (see
+SudokuGrid.index), so board[i] is displayed in field (i % 9, i // 9).
+
+Sets of numbers (candidates, numbers used in a row, ...) are bitmasks:
+bit n (1 << n) is set, if n is in the set, so ALL (0x3fe) contains the
+numbers 1 - 9. Use candidate_mask() and NUMBERS to convert between
+masks and numbers.
+"""
+
+from sudokutools.sudoku import Sudoku
+
+INDICES = tuple(range(81))
+
+ROW_OF = tuple(i // 9 for i in INDICES)
+COLUMN_OF = tuple(i % 9 for i in INDICES)
+BOX_OF = tuple((i // 27) * 3 + (i % 9) // 3 for i in INDICES)
+
+ROWS = tuple(tuple(i for i in INDICES if ROW_OF[i] == n) for n in range(9))
+COLUMNS = tuple(tuple(i for i in INDICES if COLUMN_OF[i] == n)
+                for n in range(9))
+BOXES = tuple(tuple(i for i in INDICES if BOX_OF[i] == n) for n in range(9))
+
+# the 20 indices sharing a row, column or box with each index
+PEERS = tuple(
+    tuple(sorted(set(ROWS[ROW_OF[i]] + COLUMNS[COLUMN_OF[i]] +
+                     BOXES[BOX_OF[i]]) - set([i])))
+    for i in INDICES)
+PEER_SETS = tuple(frozenset(peers) for peers in PEERS)
+
+# (left, right, top, bottom) - True, if the border is a box border
+BOX_BORDERS = tuple(
+    (i % 9 == 0, i % 3 == 2, i // 9 == 0, (i // 9) % 3 == 2)
+    for i in INDICES)
+
+# bitmask of the numbers 1 - 9
+ALL = 0x3fe
+# number of numbers in each mask
+POPCOUNT = tuple(bin(mask).count("1") for mask in range(1024))
+# numbers (sorted tuple) in each mask
+NUMBERS = tuple(tuple(n for n in range(1, 10) if mask & (1 << n))
+                for mask in range(1024))
+
+# index reached from each index by a navigation action
+MOVES = {
+    "next_field": tuple(i - 8 if i % 9 == 8 else i + 1 for i in INDICES),
+    "prev_field": tuple(i + 8 if i % 9 == 0 else i - 1 for i in INDICES),
+    "next_row": tuple((i + 9) % 81 for i in INDICES),
+    "prev_row": tuple((i - 9) % 81 for i in INDICES),
+}
+
+
+def candidate_mask(numbers):
+    """Return the bitmask of numbers (iterable), ignoring all but 1 - 9."""
+    mask = 0
+    for n in numbers:
+        if 1 <= n <= 9:
+            mask |= 1 << n
+    return mask
+
+
+def to_board(sudoku):
+    """Return the numbers of sudoku as a board."""
+    return [sudoku[i % 9, i // 9] for i in INDICES]
+
+
+def to_sudoku(board):
+    """Return a new Sudoku with the numbers from board."""
+    sudoku = Sudoku()
+    for i in INDICES:
+        sudoku.set_number(i % 9, i // 9, board[i])
+    return sudoku
+
+
+def encode(board):
+    """Return board as a string of 81 digits."""
+    return "".join([str(n) for n in board])
+
+
+def decode(s):
+    """Return a board from a string of 81 digits.
+
+    Raises:
+        ValueError: if s is not a valid board string.
+    """
+    if len(s) != 81:
+        raise ValueError("Board string must have 81 characters (%d given)."
+                         % len(s))
+    return [int(c) for c in s]
+
+
+def read_boards(lines, errors=None):
+    """Yield boards from lines of 81 digits ('.' for empty fields).
+
+    Empty lines are skipped.
+
+    Args:
+        lines (iterable):   Lines to read (e.g. an open file).
+        errors (function):  Called with (line number, ValueError) for
+                            invalid lines. Its return value is yielded
+                            in place of the board, unless it's None
+                            (then the line is skipped). If errors is
+                            None, the ValueError is raised.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip().replace(".", "0")
+        if not line:
+            continue
+        try:
+            yield decode(line)
+        except ValueError as e:
+            if errors is None:
+                raise
+            placeholder = errors(number, e)
+            if placeholder is not None:
+                yield placeholder
+
+
+# characters of sudoku codes, which describe a field
+CODE_CHARS = dict([(".", 0)] + [(str(n), n) for n in range(10)])
+
+
+def parse_code(text):
+    """Return the board described by the sudoku code text (see
+    CodeParser).
+    """
+    fields = [CODE_CHARS[c] for c in text if c in CODE_CHARS][:81]
+    return fields + [0] * (81 - len(fields))
+
+
+class CodeParser(object):
+    """Parses sudoku codes, which are edited character by character.
+
+    Every digit (or '.') in a code describes the next field, other
+    characters are ignored. Fields missing in the code are empty, fields
+    after the 81st are ignored.
+
+    update() only parses the part of the code, which changed and returns
+    the fields, whose number changed. A change, which keeps the number of
+    field characters (e.g. replacing a digit), only touches the fields
+    it replaced. Otherwise the fields after the change are shifted and
+    parsed again.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.board = [0] * 81
+        # number of field characters in text[:i] for every i
+        self.__counts = [0]
+
+    def update(self, text):
+        """Parse text and return the changed fields as (index, number)
+        pairs.
+        """
+        old = self.text
+        if text == old:
+            return []
+
+        size = min(len(old), len(text))
+        start = 0
+        while start < size and old[start] == text[start]:
+            start += 1
+        end = 0
+        while end < size - start and old[-1 - end] == text[-1 - end]:
+            end += 1
+
+        first = self.__counts[start]
+        old_fields = [CODE_CHARS[c] for c in old[start:len(old) - end]
+                      if c in CODE_CHARS]
+        new_fields = [CODE_CHARS[c] for c in text[start:len(text) - end]
+                      if c in CODE_CHARS]
+
+        if len(old_fields) == len(new_fields):
+            values = new_fields
+            stop = first + len(values)
+        else:
+            values = [CODE_CHARS[c] for c in text[start:] if c in CODE_CHARS]
+            stop = 81
+
+        counts = self.__counts
+        del counts[start + 1:]
+        count = counts[start]
+        for c in text[start:]:
+            if c in CODE_CHARS:
+                count += 1
+            counts.append(count)
+        self.text = text
+
+        changes = []
+        board = self.board
+        for index in range(first, min(stop, 81)):
+            k = index - first
+            number = values[k] if k < len(values) else 0
+            if board[index] != number:
+                board[index] = number
+                changes.append((index, number))
+        return changes
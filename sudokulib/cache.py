@@ -0,0 +1,440 @@
+"""Module that caches solutions, uniqueness and difficulty of boards.
+
+Boards are cached under their canonical form (see sudokulib.symmetry),
+so a board, which is a relabeling, rotation, ... of a board solved
+before, is a cache hit, too. For every canonical board the cache keeps
+an Entry with the solution, the number of solutions (0, 1 or 2 for
+"multiple") and the Rating, each of them as far as it is known. (The
+logical techniques scan the fields in order, so the number of steps may
+differ slightly between equivalent boards. The cache returns the Rating
+computed first.)
+
+Computing the canonical form takes about as long as solving a typical
+puzzle, so it is only done, when needed: queries are answered from an
+in-memory LRU of the exact boards first, then boards are computed
+directly with a small time budget (DIRECT_TIMEOUT) and only boards
+exceeding it are looked up by their canonical form.
+
+Canonical entries are kept in an in-memory LRU (MEMORY_ENTRIES entries)
+in front of an optional store file. The store file has a fixed size:
+entries are hashed into buckets of WAYS records and a full bucket evicts
+the least recently used of them. Records are checksummed, so torn
+writes are treated as empty records.
+
+    header:  magic (b"SDKS"), version, number of buckets, use counter
+             (little-endian uint32)
+    records: last use, crc32, canonical board, canonical solution,
+             solution count, rating (see RECORD)
+
+Boards with too few numbers to compute the canonical form quickly are
+only cached as exact boards.
+
+Usage:
+
+    cache = SolutionCache("solutions.cache")
+    solution = cache.solve(board)
+    count = cache.count_solutions(board, limit=2)
+    cache.close()
+"""
+
+from collections import OrderedDict, namedtuple
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from sudokulib.collection import PUZZLE_SIZE, digest, pack_board, \
+    unpack_board
+from sudokulib.logic import TECHNIQUES
+from sudokulib.rating import LEVEL_NAMES, Rating, rate
+from sudokulib.solver import SearchTimeout, find_solutions, make_unique
+from sudokulib.symmetry import canonical_form
+
+MAGIC = b"SDKS"
+VERSION = 1
+
+HEADER = struct.Struct("<4sIII")
+# last use, crc32 (of the rest), board, solution, count, level, hardest,
+# steps, score, solved
+RECORD = struct.Struct("<II%ds%dsbbbHHB" % (PUZZLE_SIZE, PUZZLE_SIZE))
+CHECKED = struct.Struct("<%ds%dsbbbHHB" % (PUZZLE_SIZE, PUZZLE_SIZE))
+
+# records per bucket
+WAYS = 4
+# default size of the store file (in bytes)
+MAX_SIZE = 4 * 1024 * 1024
+# default number of entries kept in memory (exact and canonical boards)
+MEMORY_ENTRIES = 256
+# time budget (in seconds) for computing a board directly, before its
+# canonical form is computed
+DIRECT_TIMEOUT = 0.01
+
+# names of the hardest technique of ratings (stored as index)
+HARDEST = tuple(name for (name, _, _) in TECHNIQUES) + ("guessing", )
+
+NO_SOLUTION = bytes(PUZZLE_SIZE)
+
+
+class Entry(namedtuple("EntryTuple", ["solution", "count", "rating"])):
+    """What is known about a canonical board.
+
+    Attributes:
+        solution (list):    A solution (canonical board) or None.
+        count (int):        Number of solutions (at most 2) or None.
+        rating (Rating):    The Rating or None.
+    """
+
+    def apply(self, transform):
+        """Return this entry in the labeling of the canonical board."""
+        if self.solution is None:
+            return self
+        return self._replace(solution=transform.apply(self.solution))
+
+    def revert(self, transform):
+        """Return this entry (of the canonical board) in the labeling of
+        the board.
+        """
+        if self.solution is None:
+            return self
+        return self._replace(solution=transform.revert(self.solution))
+
+    def merge(self, other):
+        """Return this entry with the unknown attributes taken from
+        other.
+        """
+        return Entry(*[a if a is not None else b
+                       for a, b in zip(self, other)])
+
+
+EMPTY = Entry(None, None, None)
+
+
+def pack_entry(key, entry):
+    """Return the fields of RECORD (without last use and crc) for the
+    entry of the canonical board key (packed).
+    """
+    rating = entry.rating
+    if rating is None:
+        rating_fields = (-1, -1, 0, 0, 0)
+    else:
+        rating_fields = (
+            LEVEL_NAMES.index(rating.level),
+            HARDEST.index(rating.hardest) if rating.hardest else -1,
+            min(rating.steps, 0xffff), rating.score, rating.solved)
+
+    return (key,
+            pack_board(entry.solution) if entry.solution else NO_SOLUTION,
+            -1 if entry.count is None else entry.count) + rating_fields
+
+
+def unpack_entry(fields):
+    """Return the Entry of the RECORD fields (without last use and crc)."""
+    _, solution, count, level, hardest, steps, score, solved = fields
+    rating = None
+    if level >= 0:
+        rating = Rating(score, LEVEL_NAMES[level],
+                        HARDEST[hardest] if hardest >= 0 else None,
+                        steps, bool(solved))
+    return Entry(unpack_board(solution) if solution != NO_SOLUTION else None,
+                 None if count < 0 else count, rating)
+
+
+class SolutionStore(object):
+    def __init__(self, filename, max_size=MAX_SIZE):
+        """Open the store in filename or create it.
+
+        A store of another size or version is replaced by an empty one.
+
+        Raises:
+            IOError:    if the file can't be opened or created.
+        """
+        self.filename = filename
+        self.buckets = max(
+            1, (max_size - HEADER.size) // (RECORD.size * WAYS))
+        size = HEADER.size + self.buckets * WAYS * RECORD.size
+
+        if not self.__valid(filename, size):
+            with open(filename, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.buckets, 0))
+                f.truncate(size)
+
+        self.__file = open(filename, "r+b")
+        self.__map = mmap.mmap(self.__file.fileno(), size)
+        self.__clock = HEADER.unpack_from(self.__map, 0)[3]
+
+    def __valid(self, filename, size):
+        if not os.path.exists(filename) or \
+                os.path.getsize(filename) != size:
+            return False
+        with open(filename, "rb") as f:
+            try:
+                magic, version, buckets, _ = HEADER.unpack(
+                    f.read(HEADER.size))
+            except struct.error:
+                return False
+        return magic == MAGIC and version == VERSION and \
+            buckets == self.buckets
+
+    def close(self):
+        HEADER.pack_into(
+            self.__map, 0, MAGIC, VERSION, self.buckets, self.__clock)
+        self.__map.flush()
+        self.__map.close()
+        self.__file.close()
+
+    def __offsets(self, key):
+        start = HEADER.size + \
+            (digest(key) % self.buckets) * WAYS * RECORD.size
+        return range(start, start + WAYS * RECORD.size, RECORD.size)
+
+    def __tick(self):
+        self.__clock = (self.__clock + 1) & 0xffffffff or 1
+        return self.__clock
+
+    def __read(self, offset):
+        """Return the fields of the record at offset (last use first) or
+        None, if it's empty or damaged.
+        """
+        fields = RECORD.unpack_from(self.__map, offset)
+        if not fields[0] or fields[1] != zlib.crc32(
+                self.__map[offset + 8:offset + RECORD.size]):
+            return None
+        return fields
+
+    def get(self, key):
+        """Return the Entry of the canonical board key (packed) or None."""
+        for offset in self.__offsets(key):
+            fields = self.__read(offset)
+            if fields and fields[2] == key:
+                # mark as used
+                struct.pack_into("<I", self.__map, offset, self.__tick())
+                return unpack_entry(fields[2:])
+        return None
+
+    def put(self, key, entry):
+        """Store the Entry of the canonical board key (packed).
+
+        The entry replaces the one of key, an empty record or the least
+        recently used record of the bucket.
+        """
+        # (rank, offset): the record of key, then empty records, then
+        # the least recently used one
+        target = None
+        for offset in self.__offsets(key):
+            fields = self.__read(offset)
+            if fields is None:
+                rank = (1, 0)
+            elif fields[2] == key:
+                rank = (0, 0)
+            else:
+                rank = (2, fields[0])
+            if target is None or rank < target[0]:
+                target = (rank, offset)
+        target = target[1]
+
+        data = CHECKED.pack(*pack_entry(key, entry))
+        self.__map[target:target + RECORD.size] = \
+            struct.pack("<II", self.__tick(), zlib.crc32(data)) + data
+
+
+class SolutionCache(object):
+    def __init__(self, filename=None, memory_entries=MEMORY_ENTRIES,
+                 max_size=MAX_SIZE):
+        """Create a cache (stored in filename, if given).
+
+        Methods may be called from several threads. Searches run
+        without holding the lock, so they may run in parallel.
+
+        Raises:
+            IOError:    if the store file can't be opened or created.
+        """
+        # exact board -> Entry (in the labeling of the board)
+        self.__boards = OrderedDict()
+        # canonical board -> Entry (canonical labeling)
+        self.__memory = OrderedDict()
+        self.__memory_entries = memory_entries
+        self.__store = SolutionStore(filename, max_size) if filename \
+            else None
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self.__lock:
+            if self.__store:
+                self.__store.close()
+                self.__store = None
+
+    def __remember(self, entries, key, entry):
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.__memory_entries:
+            entries.popitem(last=False)
+
+    def __get_exact(self, key):
+        with self.__lock:
+            entry = self.__boards.get(key)
+            if entry is None:
+                return EMPTY
+            self.__boards.move_to_end(key)
+            return entry
+
+    def __put_exact(self, key, entry):
+        with self.__lock:
+            old = self.__boards.get(key)
+            if old is not None:
+                entry = entry.merge(old)
+            self.__remember(self.__boards, key, entry)
+
+    def __get(self, key):
+        with self.__lock:
+            entry = self.__memory.get(key)
+            if entry is not None:
+                self.__memory.move_to_end(key)
+            elif self.__store:
+                entry = self.__store.get(key)
+                if entry is not None:
+                    self.__remember(self.__memory, key, entry)
+            return entry or EMPTY
+
+    def __put(self, key, entry):
+        with self.__lock:
+            old = self.__memory.get(key)
+            if old is None and self.__store:
+                old = self.__store.get(key)
+            if old is not None:
+                entry = entry.merge(old)
+            self.__remember(self.__memory, key, entry)
+            if self.__store:
+                self.__store.put(key, entry)
+
+    def __query(self, board, known, compute, kwargs, direct=True):
+        """Return the answer to a query about board.
+
+        The exact board is looked up first. Then (if direct is True)
+        compute runs with a time budget of DIRECT_TIMEOUT, since most
+        boards are computed faster than their canonical form. Only then
+        the canonical form is looked up and finally compute runs
+        without this budget.
+
+        Args:
+            known (function):   known(entry) returns (True, answer), if
+                                the Entry answers the query, otherwise
+                                (False, None).
+            compute (function): compute(board, **kwargs) returns
+                                (answer, Entry of board).
+            kwargs (dict):      Keyword arguments for compute.
+        """
+        exact = pack_board(board)
+        found, answer = known(self.__get_exact(exact))
+        if found:
+            self.hits += 1
+            return answer
+
+        if direct:
+            start = time.time()
+            timeout = kwargs.get("timeout")
+            try:
+                answer, entry = compute(board, **dict(
+                    kwargs, timeout=DIRECT_TIMEOUT if timeout is None
+                    else min(timeout, DIRECT_TIMEOUT)))
+            except SearchTimeout:
+                if timeout is not None:
+                    if timeout <= DIRECT_TIMEOUT:
+                        raise
+                    kwargs = dict(
+                        kwargs, timeout=timeout - (time.time() - start))
+            else:
+                self.misses += 1
+                self.__put_exact(exact, entry)
+                return answer
+
+        form = canonical_form(board)
+        if form is not None:
+            canonical, transform = form
+            key = pack_board(canonical)
+            entry = self.__get(key).revert(transform)
+            found, answer = known(entry)
+            if found:
+                self.hits += 1
+                self.__put_exact(exact, entry)
+                return answer
+
+        answer, entry = compute(board, **kwargs)
+        self.misses += 1
+        self.__put_exact(exact, entry)
+        if form is not None:
+            self.__put(key, entry.apply(transform))
+        return answer
+
+    def solve(self, board, **kwargs):
+        """Return a solution of board or None, if there is none.
+
+        Keyword arguments are passed to the search (see
+        sudokulib.solver.Search).
+        """
+        def known(entry):
+            if entry.solution is not None:
+                return True, entry.solution
+            return entry.count == 0, None
+
+        def compute(board, **kwargs):
+            solutions = find_solutions(board, 1, **kwargs)
+            if not solutions:
+                return None, Entry(None, 0, None)
+            return solutions[0], Entry(solutions[0], None, None)
+
+        return self.__query(board, known, compute, kwargs)
+
+    def count_solutions(self, board, limit=2, **kwargs):
+        """Return the number of solutions of board (but at most limit).
+
+        Keyword arguments are passed to the search (see
+        sudokulib.solver.Search).
+        """
+        def known(entry):
+            if entry.count is not None and (entry.count < 2 or limit <= 2):
+                return True, min(entry.count, limit)
+            return False, None
+
+        def compute(board, **kwargs):
+            solutions = find_solutions(board, limit, **kwargs)
+            count = len(solutions)
+            # the count is exact, if less than limit solutions were found
+            exact = min(count, 2) if count < limit or limit >= 2 else None
+            return count, Entry(
+                solutions[0] if solutions else None, exact, None)
+
+        return self.__query(board, known, compute, kwargs)
+
+    def make_unique(self, board, **kwargs):
+        """Return the givens, which make board unique (see
+        sudokulib.solver.make_unique()).
+        """
+        def known(entry):
+            if entry.count == 0:
+                return True, None
+            if entry.count == 1:
+                return True, []
+            return False, None
+
+        def compute(board, **kwargs):
+            givens = make_unique(board, **kwargs)
+            if givens is None:
+                return None, Entry(None, 0, None)
+            return givens, Entry(None, 2 if givens else 1, None)
+
+        return self.__query(board, known, compute, kwargs)
+
+    def rate(self, board):
+        """Return the Rating of board (see sudokulib.rating.rate())."""
+        def known(entry):
+            return entry.rating is not None, entry.rating
+
+        def compute(board):
+            rating = rate(board)
+            return rating, Entry(None, None, rating)
+
+        return self.__query(board, known, compute, {}, direct=False)
@@ -0,0 +1,240 @@
+"""Module that draws the whole sudoku grid in a single widget.
+
+SudokuGrid (see sudokulib.grid) uses a Label per field, so every changed
+field is retextured and laid out on its own. CanvasGrid draws the board
+with the canvas instructions of one widget instead: backgrounds and
+highlights are colored rectangles, the grid lines are 20 Line
+instructions and numbers and candidates are regions of a glyph atlas, a
+single texture with the digits 1 - 9, which is rendered once per font
+size. Changing a field only updates its instructions and the glyphs of
+all changed fields are redrawn once per frame.
+
+CanvasGrid has the same API (fields, select(), sync(),
+lock_filled_fields(), ...) as SudokuGrid, so the screens work with
+either of them (see the setting "Grid renderer").
+"""
+
+# kivy imports
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.event import EventDispatcher
+from kivy.graphics import Color, InstructionGroup, Line, Rectangle
+from kivy.metrics import sp
+from kivy.properties import ObjectProperty
+from kivy.uix.widget import Widget
+
+# local imports
+from sudokulib.board import NUMBERS
+from sudokulib.field import BACKGROUND_COLORS, HIGHLIGHT_COLORS, FieldBase
+from sudokulib.grid import GridBase
+from sudokulib.trace import traced
+
+TEXT_COLOR = (0, 0, 0, 1)
+DISABLED_TEXT_COLOR = (0, 0, 0, 0.5)
+
+BORDER_COLOR = (0.5, 0.5, 0.5, 1)
+THICK_BORDER_COLOR = (0, 0, 0, 1)
+BORDER_WIDTH = 1
+THICK_BORDER_WIDTH = 1.5
+
+
+class GlyphAtlas(object):
+    """The digits 1 - 9 rendered in one texture.
+
+    glyphs[n] is the texture region of digit n. The digits of the
+    default font have the same width, so the regions are equally wide.
+    """
+
+    def __init__(self, font_size):
+        label = CoreLabel(text="123456789", font_size=sp(font_size))
+        label.refresh()
+        self.texture = label.texture
+
+        width, height = self.texture.size
+        bounds = [int(round(n * width / 9.0)) for n in range(10)]
+        self.glyphs = (None, ) + tuple(
+            self.texture.get_region(
+                bounds[n], 0, bounds[n + 1] - bounds[n], height)
+            for n in range(9))
+
+
+class CanvasField(FieldBase, EventDispatcher):
+    """A field of CanvasGrid, which displays itself through the canvas
+    instructions of the grid.
+    """
+    __events__ = ('on_select', 'on_set')
+
+    def __init__(self, grid, coords):
+        self.grid = grid
+        self.number = 0
+        self.mask = None
+
+        self.background = Color(rgba=BACKGROUND_COLORS["default"][1])
+        self.background_rect = Rectangle()
+        self.highlight = Color(rgba=HIGHLIGHT_COLORS["default"][1])
+        self.highlight_rect = Rectangle()
+        self.glyphs = InstructionGroup()
+
+        super(CanvasField, self).__init__(coords=coords)
+
+    def show_number(self, number):
+        if number != self.number or self.mask is not None:
+            self.number = number
+            self.mask = None
+            self.grid.invalidate(self)
+
+    def show_candidates(self, mask):
+        if mask != self.mask:
+            self.number = 0
+            self.mask = mask
+            self.grid.invalidate(self)
+
+    def show_highlight(self, color):
+        self.highlight.rgba = color
+
+    def show_background(self, color):
+        self.background.rgba = color
+
+
+class CanvasGrid(GridBase, Widget):
+    """Grid of 81 CanvasFields drawn in a single widget."""
+    __events__ = ('on_field_select', 'on_field_set', 'on_sync')
+
+    control = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        super(CanvasGrid, self).__init__(**kwargs)
+
+        self.__number_atlas = None
+        self.__candidate_atlas = None
+        self.__dirty = set()
+        self.__trigger_redraw = Clock.create_trigger(self._redraw, -1)
+        self.__trigger_layout = Clock.create_trigger(self._layout, -1)
+
+        fields = {}
+        for y in range(9):
+            for x in range(9):
+                fields[(x, y)] = CanvasField(self, (x, y))
+
+        # draw order: backgrounds, highlights, glyphs, lines
+        with self.canvas:
+            for field in fields.values():
+                self.canvas.add(field.background)
+                self.canvas.add(field.background_rect)
+                self.canvas.add(field.highlight)
+                self.canvas.add(field.highlight_rect)
+
+            self.__text_color = Color(rgba=TEXT_COLOR)
+            for field in fields.values():
+                self.canvas.add(field.glyphs)
+
+            # (index, horizontal line, vertical line) of the grid lines
+            self.__lines = []
+            for i in range(10):
+                thick = i % 3 == 0
+                color = THICK_BORDER_COLOR if thick else BORDER_COLOR
+                width = THICK_BORDER_WIDTH if thick else BORDER_WIDTH
+                Color(rgba=color)
+                self.__lines.append((i, Line(width=width),
+                                     Line(width=width)))
+
+        self.bind(pos=self.__trigger_layout, size=self.__trigger_layout,
+                  disabled=self._on_disabled)
+        self.init_fields(fields)
+
+    def set_font_sizes(self, number_font_size, candidate_font_size):
+        self.__number_atlas = GlyphAtlas(number_font_size)
+        self.__candidate_atlas = GlyphAtlas(candidate_font_size)
+        self.__dirty.update(self.fields.values())
+        self.__trigger_redraw()
+
+    def _on_disabled(self, grid, disabled):
+        self.__text_color.rgba = DISABLED_TEXT_COLOR if disabled \
+            else TEXT_COLOR
+
+    def invalidate(self, field):
+        """Redraw the number or candidates of field on the next frame."""
+        self.__dirty.add(field)
+        self.__trigger_redraw()
+
+    def cell_rect(self, coords):
+        """Return (x, y, width, height) of the field at coords."""
+        width = self.width / 9.0
+        height = self.height / 9.0
+        x, y = coords
+        return (self.x + x * width, self.top - (y + 1) * height,
+                width, height)
+
+    def field_at(self, x, y):
+        """Return the field at the position x, y or None."""
+        if not self.collide_point(x, y) or not self.width or \
+                not self.height:
+            return None
+        column = min(8, int((x - self.x) * 9 / self.width))
+        row = min(8, int((self.top - y) * 9 / self.height))
+        return self.fields[(column, row)]
+
+    def _layout(self, *args):
+        for field in self.fields.values():
+            x, y, width, height = self.cell_rect(field.coords)
+            field.background_rect.pos = field.highlight_rect.pos = (x, y)
+            field.background_rect.size = field.highlight_rect.size = \
+                (width, height)
+
+        for i, horizontal, vertical in self.__lines:
+            y = self.top - i * self.height / 9.0
+            x = self.x + i * self.width / 9.0
+            horizontal.points = (self.x, y, self.right, y)
+            vertical.points = (x, self.y, x, self.top)
+
+        self.__dirty.update(self.fields.values())
+        self._redraw()
+
+    @traced("CanvasGrid.redraw", "redraw")
+    def _redraw(self, *args):
+        if not self.__number_atlas:
+            return
+
+        for field in self.__dirty:
+            self.__draw_glyphs(field)
+        self.__dirty.clear()
+
+    def __draw_glyphs(self, field):
+        group = field.glyphs
+        group.clear()
+        x, y, width, height = self.cell_rect(field.coords)
+
+        if field.mask is None:
+            if not 1 <= field.number <= 9:
+                return
+            glyph = self.__number_atlas.glyphs[field.number]
+            group.add(Rectangle(
+                texture=glyph, size=glyph.size,
+                pos=(int(x + (width - glyph.width) / 2),
+                     int(y + (height - glyph.height) / 2))))
+            return
+
+        # candidates in a 3x3 block
+        width /= 3.0
+        height /= 3.0
+        for n in NUMBERS[field.mask]:
+            glyph = self.__candidate_atlas.glyphs[n]
+            column, row = (n - 1) % 3, (n - 1) // 3
+            group.add(Rectangle(
+                texture=glyph, size=glyph.size,
+                pos=(int(x + column * width + (width - glyph.width) / 2),
+                     int(y + (2 - row) * height +
+                         (height - glyph.height) / 2))))
+
+    def on_touch_down(self, touch):
+        if self.disabled:
+            return False
+
+        field = self.field_at(*touch.pos)
+        if field is None:
+            return super(CanvasGrid, self).on_touch_down(touch)
+
+        field.select()
+        if touch.is_double_tap:
+            field.confirm()
+        return True
@@ -0,0 +1,316 @@
+"""Module that imports puzzle collections into a compact indexed store.
+
+Collection files from other sources contain one puzzle per line (SDM
+style, 81 consecutive fields, optionally surrounded by labels, comments
+or ratings) or puzzles as 9 lines of 9 fields (SDK style, "|" and "-"
+separators are ignored). '.' or '0' are empty fields and lines starting
+with "#" are comments.
+
+import_file() reads such a file in a single streaming pass. Puzzles with
+conflicting numbers are skipped and duplicates are dropped (by an 8 byte
+digest of each puzzle, so memory stays small even for millions of
+puzzles). The puzzles are appended to a store file:
+
+    header:  magic (b"SDKC"), version, number of puzzles
+             (little-endian uint32)
+    records: 81 4-bit numbers (PUZZLE_SIZE bytes) per puzzle
+
+Records have a fixed size, so the store is accessed via mmap and any
+page of puzzles is read without loading the rest.
+
+Usage:
+
+    result = import_file("top95.sdm", "collection.puzzles")
+    collection = Collection("collection.puzzles")
+    boards = collection.page(0, 10)
+    collection.close()
+
+From the command line:
+
+    python -m sudokulib.collection import collection.puzzles top95.sdm
+"""
+
+import argparse
+from collections import namedtuple
+from hashlib import blake2b
+import mmap
+import os
+import re
+import struct
+import sys
+
+from sudokulib.board import BOX_OF, CODE_CHARS, COLUMN_OF, INDICES, ROW_OF, \
+    encode
+
+MAGIC = b"SDKC"
+VERSION = 1
+
+HEADER = struct.Struct("<4sII")
+PUZZLE_SIZE = 41
+
+# a puzzle in SDM style: exactly 81 consecutive field characters
+SDM_PUZZLE = re.compile(r"(?<![0-9.])[0-9.]{81}(?![0-9.])")
+
+# lines read between calls of the progress function
+PROGRESS_INTERVAL = 4096
+
+
+class ImportResult(namedtuple(
+        "ImportResultTuple", ["imported", "duplicates", "invalid"])):
+    """Number of imported, duplicate and invalid puzzles of an import."""
+    pass
+
+
+def pack_board(board):
+    """Pack board into PUZZLE_SIZE bytes."""
+    fields = list(board) + [0]
+    return bytes(fields[i] | (fields[i + 1] << 4) for i in range(0, 82, 2))
+
+
+def unpack_board(data):
+    """Return the board packed in data."""
+    return [(data[i >> 1] >> ((i & 1) * 4)) & 0xf for i in INDICES]
+
+
+def has_conflicts(board):
+    """Return, if a number appears twice in a row, column or box."""
+    rows = [0] * 9
+    columns = [0] * 9
+    boxes = [0] * 9
+    for i in INDICES:
+        number = board[i]
+        if not number:
+            continue
+        bit = 1 << number
+        r, c, b = ROW_OF[i], COLUMN_OF[i], BOX_OF[i]
+        if (rows[r] | columns[c] | boxes[b]) & bit:
+            return True
+        rows[r] |= bit
+        columns[c] |= bit
+        boxes[b] |= bit
+    return False
+
+
+def digest(record):
+    """Return the 8 byte digest (as int) used to find duplicates."""
+    return int.from_bytes(blake2b(record, digest_size=8).digest(), "little")
+
+
+def read_puzzles(lines):
+    """Yield the boards in lines (SDM or SDK style).
+
+    Invalid puzzles are yielded as None. A line is read as SDM puzzle, if
+    it contains a run of exactly 81 field characters (the first one is
+    used, anything around it is ignored).
+    """
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        match = SDM_PUZZLE.search(line)
+        if match:
+            if rows:
+                yield None
+                rows = []
+            yield [CODE_CHARS[c] for c in match.group()]
+            continue
+
+        fields = [CODE_CHARS[c] for c in line if c in CODE_CHARS]
+        if len(fields) == 9:
+            # SDK style row
+            rows.extend(fields)
+            if len(rows) == 81:
+                yield rows
+                rows = []
+        elif fields:
+            if rows:
+                yield None
+                rows = []
+            yield None
+        # lines without fields are separators
+
+    if rows:
+        yield None
+
+
+class Collection(object):
+    def __init__(self, filename):
+        """Open the collection stored in filename (read-only).
+
+        Raises:
+            IOError:    if the file can't be opened.
+            ValueError: if the file is not a valid collection.
+        """
+        self.filename = filename
+        self.__file = open(filename, "rb")
+        try:
+            self.__map = mmap.mmap(
+                self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = HEADER.unpack_from(self.__map, 0)
+        except (ValueError, mmap.error, struct.error):
+            self.__file.close()
+            raise ValueError("%s is not a valid collection." % filename)
+
+        if magic != MAGIC or version != VERSION or \
+                len(self.__map) < HEADER.size + count * PUZZLE_SIZE:
+            self.close()
+            raise ValueError("%s is not a valid collection." % filename)
+        self.__count = count
+
+    def __len__(self):
+        return self.__count
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+    def record(self, index):
+        """Return the packed puzzle at index."""
+        if not 0 <= index < self.__count:
+            raise IndexError(index)
+        offset = HEADER.size + index * PUZZLE_SIZE
+        return self.__map[offset:offset + PUZZLE_SIZE]
+
+    def get(self, index):
+        """Return the board at index."""
+        return unpack_board(self.record(index))
+
+    def page(self, start, count):
+        """Return the boards start ... start + count - 1 (as far as they
+        exist).
+        """
+        return [self.get(index)
+                for index in range(start, min(start + count, self.__count))]
+
+
+def import_puzzles(lines, filename, cancelled=None, progress=None):
+    """Append the puzzles in lines to the collection in filename.
+
+    The collection is created, if it doesn't exist. It's replaced
+    atomically, so it stays intact, if the import fails or is cancelled.
+
+    Args:
+        lines (iterable):    Lines of a collection file.
+        filename (str):      Name of the collection.
+        cancelled (function): Returns True, if the import should stop.
+        progress (function):  Called every PROGRESS_INTERVAL lines.
+
+    Returns:
+        ImportResult: or None, if the import has been cancelled.
+    """
+    seen = set()
+    count = 0
+    duplicates = 0
+    invalid = 0
+
+    tmp = filename + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0))
+
+        if os.path.exists(filename):
+            old = Collection(filename)
+            try:
+                for index in range(len(old)):
+                    record = old.record(index)
+                    seen.add(digest(record))
+                    out.write(record)
+                    count += 1
+            finally:
+                old.close()
+        existing = count
+
+        for n, board in enumerate(read_puzzles(lines), 1):
+            if not n % PROGRESS_INTERVAL:
+                if cancelled and cancelled():
+                    out.close()
+                    os.remove(tmp)
+                    return None
+                if progress:
+                    progress()
+
+            if board is None or has_conflicts(board):
+                invalid += 1
+                continue
+
+            record = pack_board(board)
+            key = digest(record)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            out.write(record)
+            count += 1
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, count))
+        out.flush()
+        os.fsync(out.fileno())
+
+    os.replace(tmp, filename)
+    return ImportResult(count - existing, duplicates, invalid)
+
+
+def import_file(source, filename, cancelled=None, progress=None):
+    """Append the puzzles in the file source to the collection filename.
+
+    Args:
+        progress (function): Called with the fraction (0.0 - 1.0) of
+                             source, which has been read.
+
+    See import_puzzles() for the other arguments and the return value.
+    """
+    size = max(1, os.path.getsize(source))
+    position = [0]
+
+    with open(source, "rb") as f:
+        def lines():
+            for line in f:
+                position[0] += len(line)
+                yield line.decode("ascii", "replace")
+
+        def report_position():
+            progress(min(1.0, float(position[0]) / size))
+
+        return import_puzzles(lines(), filename, cancelled,
+                              report_position if progress else None)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sudokulib.collection",
+        description="Import sudoku collections (SDM or SDK style).")
+    subparsers = parser.add_subparsers(dest="command")
+    import_parser = subparsers.add_parser(
+        "import", help="append puzzle files to a collection")
+    import_parser.add_argument("filename", help="collection file")
+    import_parser.add_argument("sources", nargs="+", help="files to import")
+    show_parser = subparsers.add_parser(
+        "show", help="print puzzles of a collection")
+    show_parser.add_argument("filename")
+    show_parser.add_argument("--start", type=int, default=0)
+    show_parser.add_argument("--count", type=int, default=10)
+
+    args = parser.parse_args(args)
+
+    if args.command == "import":
+        for source in args.sources:
+            result = import_file(source, args.filename)
+            print("%s: %d imported, %d duplicates, %d invalid" % (
+                (source, ) + tuple(result)))
+    elif args.command == "show":
+        collection = Collection(args.filename)
+        print("%d puzzles" % len(collection))
+        for board in collection.page(args.start, args.count):
+            print(encode(board))
+        collection.close()
+    else:
+        parser.print_help()
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
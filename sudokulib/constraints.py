@@ -0,0 +1,115 @@
+"""Module that keeps track of the constraints of a sudoku board.
+
+The ConstraintState knows the number in every field and keeps
+ * a bitmask of the numbers present and the count of every number
+   for each row, column and box,
+ * the number of peers conflicting with each field,
+ * the number of filled and conflicting fields.
+
+All of them are updated in O(peers) whenever a single field changes,
+which allows to answer "is the board complete and valid?" in O(1).
+
+Usage:
+
+    state = ConstraintState(board)
+    for index in state.set(index, number):
+        # the conflict state of the field at index has changed
+        update_highlight(index, state.conflicts[index] > 0)
+
+    if state.complete:
+        print("You won!")
+"""
+
+from sudokulib.board import BOX_OF, COLUMN_OF, INDICES, PEERS, ROW_OF
+
+
+class ConstraintState(object):
+    def __init__(self, board=None):
+        """Create a new state (for an empty board, if board is None)."""
+        self.numbers = [0] * 81
+        self.conflicts = [0] * 81
+        self.filled = 0
+        self.conflicting = 0
+
+        # masks of the numbers present in each row, column and box
+        self.row_masks = [0] * 9
+        self.column_masks = [0] * 9
+        self.box_masks = [0] * 9
+        # counts of each number in each row, column and box
+        self.__row_counts = [[0] * 10 for _ in range(9)]
+        self.__column_counts = [[0] * 10 for _ in range(9)]
+        self.__box_counts = [[0] * 10 for _ in range(9)]
+
+        if board:
+            for i in INDICES:
+                self.set(i, board[i])
+
+    @property
+    def complete(self):
+        """True, if all fields are filled and there are no conflicts."""
+        return self.filled == 81 and not self.conflicting
+
+    def used(self, index):
+        """Return the bitmask of numbers in the row, column and box of index.
+
+        Bit n (1 << n) is set, if n is present (see sudokulib.board).
+        """
+        return (self.row_masks[ROW_OF[index]] |
+                self.column_masks[COLUMN_OF[index]] |
+                self.box_masks[BOX_OF[index]])
+
+    def __count(self, index, number, delta):
+        bit = 1 << number
+
+        for counts, masks, unit in (
+                (self.__row_counts, self.row_masks, ROW_OF[index]),
+                (self.__column_counts, self.column_masks, COLUMN_OF[index]),
+                (self.__box_counts, self.box_masks, BOX_OF[index])):
+            counts[unit][number] += delta
+            if counts[unit][number]:
+                masks[unit] |= bit
+            else:
+                masks[unit] &= ~bit
+
+    def __update_conflicts(self, index, count, changed):
+        before = self.conflicts[index]
+        self.conflicts[index] = count
+        if bool(before) != bool(count):
+            changed.append(index)
+            self.conflicting += 1 if count else -1
+
+    def set(self, index, number):
+        """Set the field at index to number (0 for an empty field).
+
+        Returns:
+            list: Indices of fields, which changed from conflicting to
+                  not conflicting or vice versa.
+        """
+        old = self.numbers[index]
+        if old == number:
+            return []
+
+        changed = []
+        conflicts = self.conflicts
+        numbers = self.numbers
+        numbers[index] = number
+        count = 0
+
+        if old:
+            self.__count(index, old, -1)
+            self.filled -= 1
+        if number:
+            self.__count(index, number, 1)
+            self.filled += 1
+
+        for peer in PEERS[index]:
+            if not numbers[peer]:
+                continue
+            elif numbers[peer] == old:
+                self.__update_conflicts(peer, conflicts[peer] - 1, changed)
+            elif numbers[peer] == number:
+                self.__update_conflicts(peer, conflicts[peer] + 1, changed)
+                count += 1
+
+        self.__update_conflicts(index, count, changed)
+        return changed
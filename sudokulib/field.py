@@ -1,160 +1,146 @@
-from kivy.app import App
 from kivy.uix.label import Label
 from kivy.properties import ListProperty, NumericProperty, ObjectProperty
 
+from sudokulib.board import BOX_BORDERS, NUMBERS, candidate_mask
+from sudokulib.trace import traced
+
 BACKGROUND_COLORS = {
     "locked": (0, (0.8, 0.8, 0.8, 1)),
     "default": (1, (1, 1, 1, 1))
 }
 
 OPTIONAL_HIGHLIGHT_COLORS = {
-    "conflicts": (1, (1, 0, 0, 1)),
-    "incorrect": (2, (1, 0.4, 0.4, 1)),
-    "surrounding": (3, (0.7, 0.7, 1, 0.7)),
+    "conflicts": (2, (1, 0, 0, 1)),
+    "incorrect": (3, (1, 0.4, 0.4, 1)),
+    "surrounding": (4, (0.7, 0.7, 1, 0.7)),
 }
 
 HIGHLIGHT_COLORS = {
     "selected": (0, (0.5, 0.5, 1, 0.9)),
-    "default": (4, (1, 1, 1, 0))
+    "hint": (1, (1, 0.85, 0.3, 0.9)),
+    "default": (5, (1, 1, 1, 0))
 }
 
 HIGHLIGHT_COLORS.update(OPTIONAL_HIGHLIGHT_COLORS)
 
-class Field(Label):
-    __events__ = ('on_select', 'on_set')
+# highlight names sorted by priority (highest first)
+HIGHLIGHT_ORDER = tuple(
+    sorted(HIGHLIGHT_COLORS, key=lambda name: HIGHLIGHT_COLORS[name][0]))
 
-    """Represents on visible field in the sudoku grid.
+
+def candidate_text(mask):
+    """Return the 3x3 text displaying the candidates in mask (see
+    sudokulib.board).
     """
-    background_color = ListProperty(BACKGROUND_COLORS["default"][1])
-    highlight_color = ListProperty(HIGHLIGHT_COLORS["default"][1])
+    s = ""
+    for n in range(1, 10):
+        if mask & (1 << n):
+            s += str(n)
+        else:
+            s += '  '
+        s += ' '
+        if n % 3 == 0 and n < 9:
+            s += '\n'
+    return s
 
-    DEFAULT_BORDER_COLOR = (0.5, 0.5, 0.5, 1)
-    THICK_BORDER_COLOR = (0, 0, 0, 1)
-    left_border_color = ListProperty(DEFAULT_BORDER_COLOR)
-    right_border_color = ListProperty(DEFAULT_BORDER_COLOR)
-    top_border_color = ListProperty(DEFAULT_BORDER_COLOR)
-    bottom_border_color = ListProperty(DEFAULT_BORDER_COLOR)
 
-    DEFAULT_BORDER_WIDTH = 1
-    THICK_BORDER_WIDTH = 1.5
-    left_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
-    right_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
-    top_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
-    bottom_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
+# lookup table indexed by candidate masks
+CANDIDATE_TEXTS = tuple(candidate_text(mask) for mask in range(1024))
+
+NUMBER_TEXTS = ('', ) + tuple(str(n) for n in range(1, 10))
 
-    candidate_font_size = NumericProperty(10)
-    number_font_size = NumericProperty(10)
+
+class FieldBase(object):
+    """State of a field in the sudoku grid (content, candidates, lock and
+    highlights).
+
+    Subclasses display the state by implementing show_number(),
+    show_candidates(), show_highlight() and show_background() and
+    provide the events on_select and on_set.
+    """
 
     def __init__(self, coords=(-1, -1), **kwargs):
-        super(Field, self).__init__(**kwargs)
+        super(FieldBase, self).__init__(**kwargs)
         self.coords = coords
 
-        # app config access
-        app = App.get_running_app()
-        self.__app_config = app.config
-        app.bind(on_settings_change=self.on_settings_change)
-
-        # highlight
-        self.__highlights = ["default"]
+        # highlight (optional highlights are enabled by the grid)
+        self.__highlights = {}
+        self.__enabled = dict(
+            (name, False) for name in OPTIONAL_HIGHLIGHT_COLORS)
+        self.__top_highlight = None
+        self.reset_highlight()
 
         # state
         self.__locked = False
         self.__selected = False
         self.__content = None
+        self.__candidates = 0
         self.__is_number = True
 
-        self.__update_font_sizes()
-
-        # select border style
-        (x, y) = coords
-        if x == 0:
-            self.left_border_color = self.THICK_BORDER_COLOR
-            self.left_border_width = self.THICK_BORDER_WIDTH
-
-        if x % 3 == 2:
-            self.right_border_color = self.THICK_BORDER_COLOR
-            self.right_border_width = self.THICK_BORDER_WIDTH
-
-        if y == 0:
-            self.top_border_color = self.THICK_BORDER_COLOR
-            self.top_border_width = self.THICK_BORDER_WIDTH
+    def show_number(self, number):
+        """Display number (0 or None for an empty field)."""
+        raise NotImplementedError
 
-        if y % 3 == 2:
-            self.bottom_border_color = self.THICK_BORDER_COLOR
-            self.bottom_border_width = self.THICK_BORDER_WIDTH
+    def show_candidates(self, mask):
+        """Display the candidates in mask (bit n for n, see
+        sudokulib.board).
+        """
+        raise NotImplementedError
 
-    def __show_candidates(self):
-        self.__is_number = False
-        self.font_size = str(self.candidate_font_size) + "sp"
+    def show_highlight(self, color):
+        """Display the highlight color (rgba)."""
+        raise NotImplementedError
 
-        s = ""
-
-        try:
-            for n in range(1, 10):
-                if n in self.content:
-                    s += str(n)
-                else:
-                    s += '  '
-                s += ' '
-                if n % 3 == 0 and n < 9:
-                    s += '\n'
-            self.text = s
-        # got None
-        except TypeError:
-            self.text = ''
-
-    def __show_number(self):
-        self.__is_number = True
-
-        self.font_size = str(self.number_font_size) + "sp"
-        if not self.content:
-            self.text = ''
-        else:
-            self.text = str(self.content)
+    def show_background(self, color):
+        """Display the background color (rgba)."""
+        raise NotImplementedError
 
     def __update_highlight_color(self):
-        used_highlights = []
-        for name in self.__highlights:
-            if name in OPTIONAL_HIGHLIGHT_COLORS:
-                if self.__app_config.get("highlight", name) == "1":
-                    used_highlights.append(HIGHLIGHT_COLORS[name])
-            else:
-                used_highlights.append(HIGHLIGHT_COLORS[name])
-
-        used_highlights.sort()
-        self.highlight_color = used_highlights[0][1]
+        for name in HIGHLIGHT_ORDER:
+            if self.__highlights[name] and self.__enabled.get(name, True):
+                break
 
-    def __update_font_sizes(self):
-        self.number_font_size = int(self.__app_config.get("visuals", "number_font_size"))
-        self.candidate_font_size = int(self.__app_config.get("visuals", "candidate_font_size"))
+        if name != self.__top_highlight:
+            self.__top_highlight = name
+            self.show_highlight(HIGHLIGHT_COLORS[name][1])
 
-        if self.__is_number:
-            self.font_size = str(self.number_font_size) + "sp"
-        else:
-            self.font_size = str(self.candidate_font_size) + "sp"
+    def set_highlight_enabled(self, name, enabled):
+        """Enable or disable the optional highlight name."""
+        if self.__enabled[name] != enabled:
+            self.__enabled[name] = enabled
+            if self.__highlights[name]:
+                self.__update_highlight_color()
 
     def reset(self):
         self.lock(False)
         self.select(False)
         self.reset_highlight()
-        self.__update_highlight_color()
 
     def add_highlight(self, name):
         # YES: we want multiple times the same value
-        self.__highlights.append(name)
-        self.__update_highlight_color()
+        self.__highlights[name] += 1
+        if self.__highlights[name] == 1 and \
+                HIGHLIGHT_COLORS[name][0] < \
+                HIGHLIGHT_COLORS[self.__top_highlight][0]:
+            self.__update_highlight_color()
 
     def remove_highlight(self, name):
-        if name in self.__highlights:
-            self.__highlights.remove(name)
-            self.__update_highlight_color()
+        if self.__highlights[name]:
+            self.__highlights[name] -= 1
+            if not self.__highlights[name] and name == self.__top_highlight:
+                self.__update_highlight_color()
 
     def reset_highlight(self):
-        self.__highlights = ["default"]
+        self.__highlights = dict((name, 0) for name in HIGHLIGHT_COLORS)
+        self.__highlights["default"] = 1
+        self.__update_highlight_color()
 
     @property
     def content(self):
-        return self.__content
+        """The number (int) or the candidates (list) of this field."""
+        if self.__is_number:
+            return self.__content
+        return list(NUMBERS[self.__candidates])
 
     @content.setter
     def content(self, value):
@@ -164,14 +150,34 @@ class Field(Label):
         if value is None:
             value = 0
 
+        if isinstance(value, (list, tuple, set, frozenset)):
+            self.candidates = candidate_mask(value)
+            return
+
         self.__content = value
+        self.__is_number = True
+        self.show_number(value)
+        self.dispatch('on_set', value)
 
-        if isinstance(value, list):
-            self.__show_candidates()
-        else:
-            self.__show_number()
+    @property
+    def candidates(self):
+        """The candidates of this field as bitmask (bit n for n, see
+        sudokulib.board) or None, if the field displays a number.
+        """
+        if self.__is_number:
+            return None
+        return self.__candidates
 
-        self.dispatch('on_set', value)
+    @candidates.setter
+    def candidates(self, mask):
+        if self.__locked:
+            return
+
+        self.__content = None
+        self.__candidates = mask
+        self.__is_number = False
+        self.show_candidates(mask)
+        self.dispatch('on_set', list(NUMBERS[mask]))
 
     def on_set(self, value):
         """default handler (required)"""
@@ -182,9 +188,9 @@ class Field(Label):
 
         if locked:
             self.select(False)
-            self.background_color = BACKGROUND_COLORS["locked"][1]
+            self.show_background(BACKGROUND_COLORS["locked"][1])
         else:
-            self.background_color = BACKGROUND_COLORS["default"][1]
+            self.show_background(BACKGROUND_COLORS["default"][1])
 
     @property
     def locked(self):
@@ -208,28 +214,138 @@ class Field(Label):
         self.content = number
 
     def confirm(self):
-        if isinstance(self.content, list):
-            if len(self.content) == 1:
-                self.content = self.content[0]
+        if not self.__is_number:
+            numbers = NUMBERS[self.__candidates]
+            if len(numbers) == 1:
+                self.content = numbers[0]
 
     def toggle_candidate(self, number):
-        if isinstance(self.content, list):
-            candidates = self.content
-            if number in candidates:
-                candidates.remove(number)
-            else:
-                candidates.append(number)
-
-            self.content = candidates
+        if not 1 <= number <= 9:
+            return
+
+        if self.__is_number:
+            self.candidates = 1 << number
         else:
-            self.content = [number]
+            self.candidates = self.__candidates ^ (1 << number)
+
+    def toggle_candidates(self, numbers):
+        """Toggle several candidates with a single update.
+
+        The result is the same as calling toggle_candidate() for each
+        number in order.
+        """
+        mask = None if self.__is_number else self.__candidates
+        for number in numbers:
+            if 1 <= number <= 9:
+                bit = 1 << number
+                mask = bit if mask is None else mask ^ bit
+
+        if mask is not None and (self.__is_number or
+                                 mask != self.__candidates):
+            self.candidates = mask
+
+
+class Field(FieldBase, Label):
+    __events__ = ('on_select', 'on_set')
+
+    """Represents on visible field in the sudoku grid.
+    """
+    background_color = ListProperty(BACKGROUND_COLORS["default"][1])
+    highlight_color = ListProperty(HIGHLIGHT_COLORS["default"][1])
+
+    DEFAULT_BORDER_COLOR = (0.5, 0.5, 0.5, 1)
+    THICK_BORDER_COLOR = (0, 0, 0, 1)
+    left_border_color = ListProperty(DEFAULT_BORDER_COLOR)
+    right_border_color = ListProperty(DEFAULT_BORDER_COLOR)
+    top_border_color = ListProperty(DEFAULT_BORDER_COLOR)
+    bottom_border_color = ListProperty(DEFAULT_BORDER_COLOR)
+
+    DEFAULT_BORDER_WIDTH = 1
+    THICK_BORDER_WIDTH = 1.5
+    left_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
+    right_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
+    top_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
+    bottom_border_width = NumericProperty(DEFAULT_BORDER_WIDTH)
+
+    candidate_font_size = NumericProperty(10)
+    number_font_size = NumericProperty(10)
+
+    # rendering of the text (triggered by kivy on the next frame)
+    texture_update = traced("Field.texture_update", "redraw")(
+        Label.texture_update)
+
+    def __init__(self, coords=(-1, -1), **kwargs):
+        # displayed font (number or candidate font)
+        self.__is_number = True
+        self.__number_font = None
+        self.__candidate_font = None
+        super(Field, self).__init__(coords=coords, **kwargs)
+
+        self.set_font_sizes(self.number_font_size, self.candidate_font_size)
+
+        # select border style
+        (x, y) = coords
+        if x < 0 or y < 0:
+            return
+        left, right, top, bottom = BOX_BORDERS[x + y * 9]
+
+        if left:
+            self.left_border_color = self.THICK_BORDER_COLOR
+            self.left_border_width = self.THICK_BORDER_WIDTH
+
+        if right:
+            self.right_border_color = self.THICK_BORDER_COLOR
+            self.right_border_width = self.THICK_BORDER_WIDTH
+
+        if top:
+            self.top_border_color = self.THICK_BORDER_COLOR
+            self.top_border_width = self.THICK_BORDER_WIDTH
+
+        if bottom:
+            self.bottom_border_color = self.THICK_BORDER_COLOR
+            self.bottom_border_width = self.THICK_BORDER_WIDTH
+
+    def __set_text(self, text):
+        # avoid retexturing the label, if nothing changed
+        if self.text != text:
+            self.text = text
+
+    def show_candidates(self, mask):
+        if self.__is_number:
+            self.__is_number = False
+            self.font_size = self.__candidate_font
+
+        self.__set_text(CANDIDATE_TEXTS[mask])
+
+    def show_number(self, number):
+        if not self.__is_number:
+            self.__is_number = True
+            self.font_size = self.__number_font
+
+        try:
+            self.__set_text(NUMBER_TEXTS[number])
+        except (IndexError, TypeError):
+            self.__set_text(str(number))
+
+    def show_highlight(self, color):
+        self.highlight_color = color
+
+    def show_background(self, color):
+        self.background_color = color
+
+    def set_font_sizes(self, number_font_size, candidate_font_size):
+        self.number_font_size = number_font_size
+        self.candidate_font_size = candidate_font_size
+        self.__number_font = str(self.number_font_size) + "sp"
+        self.__candidate_font = str(self.candidate_font_size) + "sp"
+
+        if self.__is_number:
+            self.font_size = self.__number_font
+        else:
+            self.font_size = self.__candidate_font
 
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos):
             self.select()
             if touch.is_double_tap:
                 self.confirm()
-
-    def on_settings_change(self, app, section, key, value):
-        self.__update_highlight_color()
-        self.__update_font_sizes()
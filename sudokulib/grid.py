@@ -1,40 +1,104 @@
 # kivy imports
+from kivy.app import App
 from kivy.uix.gridlayout import GridLayout
 from kivy.properties import ObjectProperty
 
 # local imports
-from sudokulib.field import Field
+from sudokulib.board import MOVES
+from sudokulib.field import Field, FieldBase, OPTIONAL_HIGHLIGHT_COLORS
+from sudokulib.trace import traced
+
+FONT_SIZE_KEYS = ("number_font_size", "candidate_font_size")
 
 VALID_NUMBERS = set([1, 2, 3, 4, 5, 6, 7, 8, 9])
 
 
-class SudokuGrid(GridLayout):
-    __events__ = ('on_field_select', 'on_field_set')
+def same_content(a, b):
+    """Return, if the field contents a and b display the same."""
+    if isinstance(a, list) and isinstance(b, list):
+        return sorted(a) == sorted(b)
+    elif isinstance(a, list) or isinstance(b, list):
+        return False
+    return (a or 0) == (b or 0)
 
-    control = ObjectProperty(None)
 
-    def __init__(self, **kwargs):
-        super(SudokuGrid, self).__init__(rows=9, cols=9)
+class GridBase(object):
+    """Selection, input and syncing of the 81 fields of a grid.
+
+    Subclasses create the fields (see FieldBase), pass them to
+    init_fields() and provide the events on_field_select, on_field_set
+    and on_sync.
+    """
 
-        self.fields = {}
+    def init_fields(self, fields):
+        """Use fields (a dict coords -> field) as fields of this grid."""
+        self.fields = fields
         self.selected_field = None
+        self.__syncing = False
+
+        for field in fields.values():
+            field.bind(on_select=self.on_select)
+            field.bind(on_set=self.on_set)
+
+        # a single binding for all fields (see on_parent)
+        self.__app = App.get_running_app()
+        self.__bound = False
+        self.__bind_settings()
+
+    def __bind_settings(self):
+        if self.__bound:
+            return
+        self.__app.bind(on_settings_change=self.on_settings_change)
+        self.__bound = True
+
+        for name in OPTIONAL_HIGHLIGHT_COLORS:
+            self.__update_highlight(name)
+        self.__update_font_sizes()
+
+    def __unbind_settings(self):
+        if self.__bound:
+            self.__app.unbind(on_settings_change=self.on_settings_change)
+            self.__bound = False
+
+    def on_parent(self, grid, parent):
+        # Don't keep removed grids alive through the app binding.
+        if parent is None:
+            self.__unbind_settings()
+        else:
+            self.__bind_settings()
+
+    def __update_highlight(self, name):
+        enabled = self.__app.config.get("highlight", name) == "1"
+        for field in self.fields.values():
+            field.set_highlight_enabled(name, enabled)
 
-        # mind the order here - it's important
-        for y in range(9):
-            for x in range(9):
-                field = Field(coords=(x, y))
-                field.bind(on_select=self.on_select)
-                field.bind(on_set=self.on_set)
-                self.add_widget(field)
-                self.fields[(x, y)] = field
+    def __update_font_sizes(self):
+        config = self.__app.config
+        self.set_font_sizes(int(config.get("visuals", "number_font_size")),
+                            int(config.get("visuals", "candidate_font_size")))
+
+    def set_font_sizes(self, number_font_size, candidate_font_size):
+        """Display numbers and candidates in the given font sizes (sp)."""
+        raise NotImplementedError
+
+    def on_settings_change(self, app, section, key, value):
+        if section == "highlight" and key in OPTIONAL_HIGHLIGHT_COLORS:
+            self.__update_highlight(key)
+        elif section == "visuals" and key in FONT_SIZE_KEYS:
+            self.__update_font_sizes()
 
     def on_set(self, field, value):
-        self.dispatch('on_field_set', field, value)
+        if not self.__syncing:
+            self.dispatch('on_field_set', field, value)
 
     def on_field_set(self, field, value):
         """default handler (required)"""
         pass
 
+    def on_sync(self, fields):
+        """default handler (required)"""
+        pass
+
     @property
     def index(self):
         if not self.selected_field:
@@ -49,25 +113,20 @@ class SudokuGrid(GridLayout):
         x, y = value % 9, value // 9
         self.fields[(x, y)].select()
 
+    @traced("Grid.move", "grid")
+    def move(self, actions):
+        """Apply several navigation actions with a single selection."""
+        index = self.index
+        for action in actions:
+            index = MOVES[action][index]
+        self.index = index
+
+    @traced("Grid.select", "grid")
     def select(self, obj):
-        if isinstance(obj, Field):
+        if isinstance(obj, FieldBase):
             obj.select()
-        elif obj == "next_field":
-            x = self.index % 9
-            if x == 8:
-                self.index -= 8
-            else:
-                self.index += 1
-        elif obj == "prev_field":
-            x = self.index % 9
-            if x == 0:
-                self.index += 8
-            else:
-                self.index -= 1
-        elif obj == "next_row":
-            self.index += 9
-        elif obj == "prev_row":
-            self.index -= 9
+        elif obj in MOVES:
+            self.index = MOVES[obj][self.index]
         elif obj is None:
             self.on_select(None)
 
@@ -98,6 +157,10 @@ class SudokuGrid(GridLayout):
         if self.selected_field:
             self.selected_field.toggle_candidate(number)
 
+    def toggle_selected_candidates(self, numbers):
+        if self.selected_field:
+            self.selected_field.toggle_candidates(numbers)
+
     def lock_filled_fields(self, sudoku):
         """Lock every filled field in sudoku and unlock everything else."""
         for x in range(9):
@@ -107,17 +170,63 @@ class SudokuGrid(GridLayout):
                 else:
                     self.fields[(x, y)].lock(False)
 
+    @traced("Grid.sync", "grid")
     def sync(self, sudoku, coords=None):
+        """Unlock the fields at coords and display sudoku in them.
+
+        Only fields showing something else than sudoku are changed.
+        Instead of dispatching on_field_set for each of them, on_sync
+        is dispatched once with the list of changed fields.
+        """
         if not coords:
             coords = [(x, y) for x in range(9) for y in range(9)]
 
-        for (x, y) in coords:
-            item = sudoku[x, y]
-            field = self.fields[(x, y)]
-            field.lock(False)
+        changed = []
+        self.__syncing = True
+
+        try:
+            for (x, y) in coords:
+                item = sudoku[x, y]
+                field = self.fields[(x, y)]
+                if field.locked:
+                    field.lock(False)
+
+                if not item:
+                    candidates = sudoku.get_candidates(x, y)
+                    value = sorted(candidates) if candidates else 0
+                elif item in VALID_NUMBERS:
+                    value = item
+                else:
+                    continue
+
+                if not same_content(field.content, value):
+                    field.content = value
+                    changed.append(field)
+        finally:
+            self.__syncing = False
+
+        if changed:
+            self.dispatch('on_sync', changed)
+
+
+class SudokuGrid(GridBase, GridLayout):
+    """Grid of 81 Field widgets."""
+    __events__ = ('on_field_select', 'on_field_set', 'on_sync')
+
+    control = ObjectProperty(None)
+
+    def __init__(self, **kwargs):
+        super(SudokuGrid, self).__init__(rows=9, cols=9)
 
-            if not item:
-                candidates = sudoku.get_candidates(x, y)
-                field.content = candidates
-            elif item in VALID_NUMBERS:
-                field.content = item
+        fields = {}
+        # mind the order here - it's important
+        for y in range(9):
+            for x in range(9):
+                field = Field(coords=(x, y))
+                self.add_widget(field)
+                fields[(x, y)] = field
+        self.init_fields(fields)
+
+    def set_font_sizes(self, number_font_size, candidate_font_size):
+        for field in self.fields.values():
+            field.set_font_sizes(number_font_size, candidate_font_size)
@@ -0,0 +1,136 @@
+"""Module that records the move history of a game.
+
+Every field is described by a single int (see encode_cell): the number
+in the field or, if it's empty, the negative bitmask of its candidates
+(see sudokulib.board).
+
+The History stores each move as a step, which is a list of
+(index, old, new) deltas. Every INTERVAL steps a full copy of all
+fields (a checkpoint) is taken, so seeking to any position in the
+history replays at most INTERVAL steps.
+
+Usage:
+
+    history = History(cells)
+    history.record([(index, old, new)])
+
+    # returns the (index, value) pairs, that changed by seeking
+    changes = history.seek(history.position - 1)
+"""
+
+from sudokulib.board import ALL, NUMBERS, candidate_mask
+
+INTERVAL = 32
+
+
+def encode_cell(number, candidates=()):
+    """Return the int describing a field with number and candidates."""
+    if number:
+        return number
+    return -candidate_mask(candidates)
+
+
+def decode_cell(value):
+    """Return (number, candidates) of a field described by value."""
+    if value >= 0:
+        return value, (value, ) if value else ()
+    return 0, NUMBERS[-value & ALL]
+
+
+class History(object):
+    def __init__(self, cells, interval=INTERVAL):
+        """Create a new history starting with cells (list of 81 ints)."""
+        self.interval = interval
+        self.cells = list(cells)
+        self.position = 0
+        self.__steps = []
+        self.__checkpoints = {0: tuple(cells)}
+
+    def __len__(self):
+        """Return the number of recorded steps."""
+        return len(self.__steps)
+
+    def record(self, deltas):
+        """Record a new step at the current position.
+
+        Steps after the current position (which have been undone)
+        are discarded.
+
+        Args:
+            deltas (list): (index, old, new) triples.
+
+        Returns:
+            list: The recorded deltas (without the ones, that don't change
+                  anything).
+        """
+        deltas = [(i, old, new) for (i, old, new) in deltas if old != new]
+        if not deltas:
+            return deltas
+
+        if self.position < len(self.__steps):
+            del self.__steps[self.position:]
+            for position in list(self.__checkpoints):
+                if position > self.position:
+                    del self.__checkpoints[position]
+
+        for (i, old, new) in deltas:
+            self.cells[i] = new
+
+        self.__steps.append(deltas)
+        self.position += 1
+        if not self.position % self.interval:
+            self.__checkpoints[self.position] = tuple(self.cells)
+        return deltas
+
+    def seek(self, position):
+        """Move to position (0 - len(self)) and return the changes.
+
+        Returns:
+            list: (index, value) pairs of the fields, which changed.
+        """
+        position = max(0, min(position, len(self.__steps)))
+        before = list(self.cells)
+        cells = self.cells
+
+        if self.position <= position < self.position + self.interval:
+            start = self.position
+        elif position < self.position <= position + self.interval:
+            for step in reversed(self.__steps[position:self.position]):
+                for (i, old, new) in reversed(step):
+                    cells[i] = old
+            start = position
+        else:
+            start = position - position % self.interval
+            cells[:] = self.__checkpoints[start]
+
+        for step in self.__steps[start:position]:
+            for (i, old, new) in step:
+                cells[i] = new
+
+        self.position = position
+        return [(i, cells[i]) for i in range(81) if cells[i] != before[i]]
+
+    def encode(self):
+        """Return the history as a JSON serializable dict."""
+        return {
+            "cells": list(self.__checkpoints[0]),
+            "steps": [[list(delta) for delta in step]
+                      for step in self.__steps],
+            "position": self.position,
+        }
+
+    @classmethod
+    def decode(cls, data, interval=INTERVAL):
+        """Create a history from the output of encode().
+
+        Raises:
+            KeyError, TypeError, ValueError: if data is invalid.
+        """
+        history = cls(data["cells"], interval=interval)
+        if len(history.cells) != 81:
+            raise ValueError("History must contain 81 fields.")
+
+        for step in data["steps"]:
+            history.record([tuple(delta) for delta in step])
+        history.seek(data["position"])
+        return history
@@ -0,0 +1,151 @@
+"""Module that stores the app state as a snapshot and an append-only journal.
+
+Writing the full state on every change is expensive and writing it only,
+when the app pauses or stops, loses progress on a crash. The Journal
+keeps the state in two files instead:
+
+ * The snapshot is a JSON file, which maps keys to dicts (the same format
+   kivy's JsonStore uses). It's only written on compaction.
+ * The journal contains one JSON line [key, entry] for every change since
+   the snapshot. Lines are appended as changes happen and written to disk
+   by flush(), which can be called periodically to batch fsync calls.
+
+The snapshot and the journal carry a generation number. A journal,
+whose generation doesn't match the snapshot, is ignored, since its
+entries are already contained in the snapshot.
+
+Usage:
+
+    journal = Journal("state.json", "state.journal")
+    state, entries = journal.load()
+    # ... replay entries ...
+    if entries:
+        journal.snapshot(state)
+    # ... restore state ...
+
+    journal.append("game", {"seek": 3})
+    journal.flush()
+
+    # compaction: write the full state and start a new journal
+    journal.snapshot(state)
+"""
+
+import json
+import os
+
+# snapshot key storing the generation
+META_KEY = "__journal__"
+
+
+class DictStore(object):
+    """Minimal in-memory replacement for kivy's JsonStore."""
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else {}
+
+    def exists(self, key):
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key]
+
+    def put(self, key, **values):
+        self.data[key] = values
+
+
+class Journal(object):
+    def __init__(self, snapshot_file, journal_file):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.generation = 0
+        # number of entries since the last snapshot
+        self.entries = 0
+        self.__file = None
+        self.__dirty = False
+
+    def load(self):
+        """Read the snapshot and the journal.
+
+        Returns:
+            (dict, list): The snapshot state and the journal entries as
+                          (key, entry) pairs. Entries must be applied to
+                          the state and the result should be written by
+                          snapshot(), before new entries are appended.
+        """
+        self.close()
+
+        try:
+            with open(self.snapshot_file) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            state = {}
+
+        meta = state.pop(META_KEY, {})
+        self.generation = meta.get("generation", 0)
+
+        entries = []
+        try:
+            with open(self.journal_file) as f:
+                header = json.loads(f.readline())
+                if header.get("generation") == self.generation:
+                    for line in f:
+                        try:
+                            key, entry = json.loads(line)
+                        except ValueError:
+                            # incomplete last line
+                            break
+                        entries.append((key, entry))
+        except (IOError, OSError, ValueError, AttributeError):
+            pass
+
+        self.entries = len(entries)
+        return state, entries
+
+    def append(self, key, entry):
+        """Append entry (a JSON serializable value) for key.
+
+        The entry is buffered until the next flush().
+        """
+        if self.__file is None:
+            self.__start()
+        self.__file.write(json.dumps([key, entry]) + "\n")
+        self.__dirty = True
+        self.entries += 1
+
+    def flush(self):
+        """Write buffered entries to disk."""
+        if self.__dirty:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__dirty = False
+
+    def snapshot(self, state):
+        """Write state as new snapshot and start a new journal."""
+        self.close()
+        self.generation += 1
+
+        data = dict(state)
+        data[META_KEY] = {"generation": self.generation}
+
+        tmp = self.snapshot_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_file)
+
+        self.__start()
+
+    def close(self):
+        if self.__file is not None:
+            self.flush()
+            self.__file.close()
+            self.__file = None
+
+    def __start(self):
+        self.__file = open(self.journal_file, "w")
+        self.__file.write(json.dumps({"generation": self.generation}) + "\n")
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__dirty = False
+        self.entries = 0
@@ -0,0 +1,285 @@
+"""Module that finds logical deductions in sudoku boards.
+
+The candidates of all fields are kept as bitmasks (see sudokulib.board),
+which makes the techniques cheap enough to find the next
+deduction on any board within a few milliseconds.
+
+Techniques (in order of difficulty, see TECHNIQUES):
+ * naked single, hidden single
+ * pointing pair/triple, box/line reduction
+ * naked pair/triple, hidden pair/triple
+ * x-wing, swordfish
+
+Usage:
+
+    state = LogicState(board)
+    deduction = state.find()
+    if deduction:
+        print(describe(deduction))
+        state.apply(deduction)
+"""
+
+from collections import namedtuple
+from itertools import combinations
+
+from sudokulib.board import ALL, BOXES, BOX_OF, COLUMNS, COLUMN_OF, \
+    INDICES, NUMBERS, PEERS, POPCOUNT, ROWS, ROW_OF
+
+UNITS = ROWS + COLUMNS + BOXES
+LINES = ROWS + COLUMNS
+
+
+class Deduction(namedtuple(
+        "DeductionTuple",
+        ["technique", "cells", "placements", "eliminations"])):
+    """A single logical step.
+
+    Attributes:
+        technique (str):     Name of the technique (see TECHNIQUES).
+        cells (tuple):       Indices of the fields forming the pattern.
+        placements (tuple):  (index, number) pairs of numbers to set.
+        eliminations (tuple): (index, number) pairs of candidates to remove.
+    """
+    pass
+
+
+def candidates_of(board):
+    """Return the candidate bitmasks of all fields in board.
+
+    Filled fields have a mask of 0.
+    """
+    rows = [0] * 9
+    columns = [0] * 9
+    boxes = [0] * 9
+    for i in INDICES:
+        if board[i]:
+            bit = 1 << board[i]
+            rows[ROW_OF[i]] |= bit
+            columns[COLUMN_OF[i]] |= bit
+            boxes[BOX_OF[i]] |= bit
+
+    return [0 if board[i] else
+            ALL & ~(rows[ROW_OF[i]] | columns[COLUMN_OF[i]] |
+                    boxes[BOX_OF[i]])
+            for i in INDICES]
+
+
+def _eliminations(masks, cells, mask):
+    """Return the (index, number) pairs of the numbers in mask,
+    which are candidates of cells.
+    """
+    return tuple((i, n) for i in cells for n in NUMBERS[masks[i] & mask])
+
+
+def naked_single(board, masks):
+    for i in INDICES:
+        if not board[i] and POPCOUNT[masks[i]] == 1:
+            return Deduction(
+                "naked single", (i, ), ((i, NUMBERS[masks[i]][0]), ), ())
+
+
+def hidden_single(board, masks):
+    for unit in UNITS:
+        for n in range(1, 10):
+            bit = 1 << n
+            cells = [i for i in unit if masks[i] & bit]
+            if len(cells) == 1:
+                return Deduction(
+                    "hidden single", tuple(unit), ((cells[0], n), ), ())
+
+
+def _locked(masks, bases, covers, name):
+    # numbers in a base unit, which are restricted to one cover unit
+    for base in bases:
+        base_set = set(base)
+        for n in range(1, 10):
+            bit = 1 << n
+            cells = [i for i in base if masks[i] & bit]
+            if len(cells) < 2:
+                continue
+            for cover in covers:
+                cover_set = set(cover)
+                if not cover_set.issuperset(cells):
+                    continue
+                others = [i for i in cover if i not in base_set]
+                eliminations = _eliminations(masks, others, bit)
+                if eliminations:
+                    return Deduction(name, tuple(cells), (), eliminations)
+
+
+def pointing(board, masks):
+    return _locked(masks, BOXES, LINES, "pointing")
+
+
+def box_line_reduction(board, masks):
+    return _locked(masks, LINES, BOXES, "box/line reduction")
+
+
+def _naked_subset(board, masks, size, name):
+    for unit in UNITS:
+        cells = [i for i in unit if masks[i] and POPCOUNT[masks[i]] <= size]
+        for subset in combinations(cells, size):
+            union = 0
+            for i in subset:
+                union |= masks[i]
+            if POPCOUNT[union] != size:
+                continue
+            others = [i for i in unit if i not in subset]
+            eliminations = _eliminations(masks, others, union)
+            if eliminations:
+                return Deduction(name, subset, (), eliminations)
+
+
+def _hidden_subset(board, masks, size, name):
+    for unit in UNITS:
+        positions = {}
+        for n in range(1, 10):
+            bit = 1 << n
+            cells = tuple(i for i in unit if masks[i] & bit)
+            if 2 <= len(cells) <= size:
+                positions[n] = cells
+
+        for numbers in combinations(sorted(positions), size):
+            cells = set()
+            for n in numbers:
+                cells.update(positions[n])
+            if len(cells) != size:
+                continue
+            keep = 0
+            for n in numbers:
+                keep |= 1 << n
+            eliminations = _eliminations(masks, sorted(cells), ALL & ~keep)
+            if eliminations:
+                return Deduction(name, tuple(sorted(cells)), (), eliminations)
+
+
+def naked_pair(board, masks):
+    return _naked_subset(board, masks, 2, "naked pair")
+
+
+def naked_triple(board, masks):
+    return _naked_subset(board, masks, 3, "naked triple")
+
+
+def hidden_pair(board, masks):
+    return _hidden_subset(board, masks, 2, "hidden pair")
+
+
+def hidden_triple(board, masks):
+    return _hidden_subset(board, masks, 3, "hidden triple")
+
+
+def _fish(board, masks, size, name):
+    for bases, covers, cover_of in (
+            (ROWS, COLUMNS, COLUMN_OF), (COLUMNS, ROWS, ROW_OF)):
+        for n in range(1, 10):
+            bit = 1 << n
+            # base unit -> cover units containing n
+            lines = {}
+            for b, base in enumerate(bases):
+                found = set(cover_of[i] for i in base if masks[i] & bit)
+                if 2 <= len(found) <= size:
+                    lines[b] = found
+
+            for subset in combinations(sorted(lines), size):
+                found = set()
+                for b in subset:
+                    found.update(lines[b])
+                if len(found) != size:
+                    continue
+                base_cells = set()
+                for b in subset:
+                    base_cells.update(bases[b])
+                others = [i for c in sorted(found) for i in covers[c]
+                          if i not in base_cells]
+                eliminations = _eliminations(masks, others, bit)
+                if eliminations:
+                    cells = tuple(sorted(
+                        i for i in base_cells if masks[i] & bit and
+                        cover_of[i] in found))
+                    return Deduction(name, cells, (), eliminations)
+
+
+def x_wing(board, masks):
+    return _fish(board, masks, 2, "x-wing")
+
+
+def swordfish(board, masks):
+    return _fish(board, masks, 3, "swordfish")
+
+
+# (name, function, difficulty) ordered by difficulty
+TECHNIQUES = (
+    ("naked single", naked_single, 1),
+    ("hidden single", hidden_single, 2),
+    ("pointing", pointing, 3),
+    ("box/line reduction", box_line_reduction, 3),
+    ("naked pair", naked_pair, 4),
+    ("hidden pair", hidden_pair, 5),
+    ("naked triple", naked_triple, 5),
+    ("hidden triple", hidden_triple, 6),
+    ("x-wing", x_wing, 7),
+    ("swordfish", swordfish, 8),
+)
+
+
+class LogicState(object):
+    def __init__(self, board, masks=None):
+        """Create a new state for board.
+
+        Args:
+            board (list): The numbers of the sudoku (see sudokulib.board).
+            masks (list): Candidate bitmasks to start with. Candidates,
+                          which conflict with board are dropped.
+                          If None, all possible candidates are used.
+        """
+        self.board = list(board)
+        self.masks = candidates_of(self.board)
+        if masks is not None:
+            self.masks = [a & b for (a, b) in zip(self.masks, masks)]
+
+    @property
+    def solved(self):
+        return all(self.board)
+
+    @property
+    def broken(self):
+        """True, if an empty field has no candidates left."""
+        return any(not n and not m for (n, m) in zip(self.board, self.masks))
+
+    def find(self, techniques=TECHNIQUES):
+        """Return the next (easiest) deduction or None."""
+        if self.broken:
+            return None
+        for name, func, difficulty in techniques:
+            deduction = func(self.board, self.masks)
+            if deduction:
+                return deduction
+        return None
+
+    def apply(self, deduction):
+        """Apply the placements and eliminations of deduction."""
+        for (i, n) in deduction.placements:
+            self.board[i] = n
+            self.masks[i] = 0
+            bit = 1 << n
+            for peer in PEERS[i]:
+                self.masks[peer] &= ~bit
+        for (i, n) in deduction.eliminations:
+            self.masks[i] &= ~(1 << n)
+
+
+def describe(deduction):
+    """Return a short human-readable description of deduction."""
+    def field(i):
+        return "row %d, column %d" % (i // 9 + 1, i % 9 + 1)
+
+    if deduction.placements:
+        (i, n) = deduction.placements[0]
+        return "%s: %d in %s" % (deduction.technique.capitalize(), n, field(i))
+
+    numbers = sorted(set(n for (_, n) in deduction.eliminations))
+    return "%s: remove %s from %d field(s)" % (
+        deduction.technique.capitalize(),
+        ", ".join(str(n) for n in numbers),
+        len(set(i for (i, _) in deduction.eliminations)))
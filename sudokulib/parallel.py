@@ -0,0 +1,77 @@
+"""Module that maps functions over long streams in a pool of processes.
+
+Items are consumed lazily and sent to the worker processes in chunks.
+Only a few chunks per process are in flight at once and results are
+yielded in input order, so arbitrary long streams are processed in
+constant memory, while all processes are kept busy.
+
+Usage:
+
+    for board, solution in map_chunked(solve_board, boards):
+        print(solution)
+"""
+
+from collections import deque
+from multiprocessing import Pool, cpu_count
+
+# items sent to a worker process at once
+CHUNKSIZE = 64
+# chunks in flight per process
+CHUNKS_PER_PROCESS = 2
+
+
+def call_chunk(func, chunk):
+    """Return the results of func for all items in chunk."""
+    return [func(item) for item in chunk]
+
+
+def map_chunked(func, items, processes=None, chunksize=CHUNKSIZE):
+    """Apply func to items (an iterable) in a pool of processes.
+
+    Args:
+        func (function):    Function to apply (must be picklable, i.e.
+                            defined at module level or a partial of it).
+        items (iterable):   Items to process.
+        processes (int):    Number of processes (defaults to the number
+                            of cpus). 1 processes all items in the
+                            calling process.
+        chunksize (int):    Items sent to a process at once.
+
+    Yields:
+        (item, result) pairs in input order.
+    """
+    if processes == 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    processes = processes or cpu_count()
+    pool = Pool(processes)
+    pending = deque()
+
+    def submit(chunk):
+        pending.append((chunk, pool.apply_async(call_chunk, (func, chunk))))
+
+    def collect():
+        chunk, result = pending.popleft()
+        return zip(chunk, result.get())
+
+    try:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) < chunksize:
+                continue
+            submit(chunk)
+            chunk = []
+            if len(pending) >= CHUNKS_PER_PROCESS * processes:
+                for pair in collect():
+                    yield pair
+
+        if chunk:
+            submit(chunk)
+        while pending:
+            for pair in collect():
+                yield pair
+    finally:
+        pool.terminate()
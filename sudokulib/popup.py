@@ -1,9 +1,13 @@
-"""Module that provides a simple Popup with function callbacks."""
+"""Module that provides simple Popups with function callbacks."""
 
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
+from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
+from kivy.uix.progressbar import ProgressBar
+
+from sudokulib.board import INDICES
 
 
 class CallbackPopup(Popup):
@@ -22,7 +26,7 @@ class CallbackPopup(Popup):
         for (btn_text, callback) in callbacks:
             btn = Button(text=btn_text)
             btn.callback = callback
-            btn.bind(on_release=self.__run_callback)
+            btn.bind(on_release=self._run_callback)
             buttons.add_widget(btn)
 
         layout = BoxLayout(orientation="vertical")
@@ -31,6 +35,166 @@ class CallbackPopup(Popup):
 
         self.add_widget(layout)
 
-    def __run_callback(self, btn):
+    def _run_callback(self, btn):
         btn.callback()
-        self.dismiss()
\ No newline at end of file
+        self.dismiss()
+
+
+class ProgressPopup(Popup):
+    def __init__(self, text='', on_cancel=None, **kwargs):
+        """Create a new popup widget with a progress bar.
+
+        Args:
+            text (str):            Text to be displayed by the popup
+            on_cancel (function):  Called, when the cancel button is
+                                   pressed. If None, no button is shown.
+        """
+        kwargs.setdefault("auto_dismiss", False)
+        super(ProgressPopup, self).__init__(**kwargs)
+
+        self.__on_cancel = on_cancel
+        self.__bar = ProgressBar(max=1.0, value=0, size_hint_y=0.3)
+
+        layout = BoxLayout(orientation="vertical")
+        layout.add_widget(Label(text=text, size_hint_y=0.5))
+        layout.add_widget(self.__bar)
+
+        if on_cancel:
+            btn = Button(text="Cancel", size_hint_y=0.2)
+            btn.bind(on_release=self._cancel)
+            layout.add_widget(btn)
+
+        self.add_widget(layout)
+
+    def set_progress(self, progress):
+        """Set the progress bar to progress (0.0 - 1.0)."""
+        self.__bar.value = progress
+
+    def _cancel(self, btn):
+        self.dismiss()
+        self.__on_cancel()
+
+
+class FileChooserPopup(Popup):
+    def __init__(self, on_select, path=".", **kwargs):
+        """Create a new popup to choose a file.
+
+        Args:
+            on_select (function):  Called with the name of the chosen file.
+            path (str):            Directory to start in.
+        """
+        super(FileChooserPopup, self).__init__(**kwargs)
+
+        self.__on_select = on_select
+        self.__chooser = FileChooserListView(path=path, size_hint_y=0.85)
+
+        buttons = BoxLayout(orientation="horizontal", size_hint_y=0.15)
+        select = Button(text="Select")
+        select.bind(on_release=self._select)
+        cancel = Button(text="Cancel")
+        cancel.bind(on_release=lambda btn: self.dismiss())
+        buttons.add_widget(select)
+        buttons.add_widget(cancel)
+
+        layout = BoxLayout(orientation="vertical")
+        layout.add_widget(self.__chooser)
+        layout.add_widget(buttons)
+        self.add_widget(layout)
+
+    def _select(self, btn):
+        if self.__chooser.selection:
+            self.dismiss()
+            self.__on_select(self.__chooser.selection[0])
+
+
+class CollectionPopup(Popup):
+    PAGE_SIZE = 10
+
+    def __init__(self, collection, on_select, on_import=None, **kwargs):
+        """Create a new popup, which pages through a collection.
+
+        Only the puzzles of the displayed page are read.
+
+        Args:
+            collection (Collection): The collection (None, if empty).
+            on_select (function):    Called with the chosen board.
+            on_import (function):    Called, when the import button is
+                                     pressed. If None, no button is shown.
+        """
+        super(CollectionPopup, self).__init__(**kwargs)
+
+        self.__collection = collection
+        self.__on_select = on_select
+        self.__on_import = on_import
+        self.__count = len(collection) if collection else 0
+        self.__pages = max(1, -(-self.__count // self.PAGE_SIZE))
+        self.__page = 0
+        self.__boards = []
+
+        entries = BoxLayout(orientation="vertical", size_hint_y=0.85)
+        self.__buttons = []
+        for n in range(self.PAGE_SIZE):
+            btn = Button(halign="left", font_size="12sp")
+            btn.index = n
+            btn.bind(on_release=self._select)
+            entries.add_widget(btn)
+            self.__buttons.append(btn)
+
+        navigation = BoxLayout(orientation="horizontal", size_hint_y=0.15)
+        self.__prev = Button(text="<")
+        self.__prev.bind(on_release=lambda btn: self.show_page(
+            self.__page - 1))
+        self.__next = Button(text=">")
+        self.__next.bind(on_release=lambda btn: self.show_page(
+            self.__page + 1))
+        self.__label = Label()
+        navigation.add_widget(self.__prev)
+        navigation.add_widget(self.__label)
+        navigation.add_widget(self.__next)
+        if on_import:
+            btn = Button(text="Import...")
+            btn.bind(on_release=self._import)
+            navigation.add_widget(btn)
+        close = Button(text="Close")
+        close.bind(on_release=lambda btn: self.dismiss())
+        navigation.add_widget(close)
+
+        layout = BoxLayout(orientation="vertical")
+        layout.add_widget(entries)
+        layout.add_widget(navigation)
+        self.add_widget(layout)
+
+        self.show_page(0)
+
+    def show_page(self, page):
+        """Display page (0 - number of pages - 1)."""
+        self.__page = max(0, min(page, self.__pages - 1))
+        start = self.__page * self.PAGE_SIZE
+        if self.__collection:
+            self.__boards = self.__collection.page(start, self.PAGE_SIZE)
+
+        for n, btn in enumerate(self.__buttons):
+            if n < len(self.__boards):
+                board = self.__boards[n]
+                btn.text = "%d.  %s  (%d numbers)" % (
+                    start + n + 1,
+                    "".join(str(c) if c else "." for c in board),
+                    len([i for i in INDICES if board[i]]))
+                btn.disabled = False
+            else:
+                btn.text = ""
+                btn.disabled = True
+
+        self.__label.text = "%d / %d (%d puzzles)" % (
+            self.__page + 1, self.__pages, self.__count)
+        self.__prev.disabled = self.__page == 0
+        self.__next.disabled = self.__page == self.__pages - 1
+
+    def _select(self, btn):
+        board = self.__boards[btn.index]
+        self.dismiss()
+        self.__on_select(board)
+
+    def _import(self, btn):
+        self.dismiss()
+        self.__on_import()
@@ -0,0 +1,136 @@
+"""Module that rates the difficulty of sudoku boards.
+
+A board is solved step by step with the logical techniques from
+sudokulib.logic (always using the easiest one, that applies). The rating
+is determined by the hardest technique required and the number of steps.
+Boards, which can't be solved by these techniques, require guessing and
+get the difficulty GUESSING.
+
+Large lists of boards can be rated in parallel with rate_many(), which
+yields the ratings in input order as soon as they are available.
+
+Usage:
+
+    rating = rate(board)
+    print(rating.level, rating.score)
+
+    for board, rating in rate_many(boards):
+        print(rating.level)
+
+From the command line (one board of 81 digits per line):
+
+    python -m sudokulib.rating puzzles.txt
+"""
+
+import argparse
+import sys
+from collections import namedtuple
+
+from sudokulib.board import encode, read_boards
+from sudokulib.logic import TECHNIQUES, LogicState
+from sudokulib.parallel import CHUNKSIZE, map_chunked
+
+# difficulty of boards, which can't be solved without guessing
+GUESSING = max(difficulty for (_, _, difficulty) in TECHNIQUES) + 1
+
+# level name -> highest difficulty of the level (None for no limit)
+LEVELS = (
+    ("easy", 2),
+    ("medium", 5),
+    ("hard", None),
+)
+LEVEL_NAMES = tuple(name for (name, _) in LEVELS)
+
+DIFFICULTIES = dict((name, difficulty)
+                    for (name, _, difficulty) in TECHNIQUES)
+
+
+class Rating(namedtuple(
+        "RatingTuple", ["score", "level", "hardest", "steps", "solved"])):
+    """The difficulty of a board.
+
+    Attributes:
+        score (int):    hardest difficulty * 100 + steps (higher is harder).
+        level (str):    One of LEVEL_NAMES.
+        hardest (str):  Name of the hardest technique used (or "guessing").
+        steps (int):    Number of logical steps.
+        solved (bool):  True, if the board was solved without guessing.
+    """
+    pass
+
+
+def level_of(difficulty):
+    """Return the name of the level containing difficulty."""
+    for name, limit in LEVELS:
+        if limit is None or difficulty <= limit:
+            return name
+
+
+def rate(board):
+    """Return the Rating of board."""
+    state = LogicState(board)
+    difficulty = 0
+    hardest = None
+    steps = 0
+
+    while not state.solved:
+        deduction = state.find()
+        if deduction is None:
+            break
+        steps += 1
+        if DIFFICULTIES[deduction.technique] > difficulty:
+            difficulty = DIFFICULTIES[deduction.technique]
+            hardest = deduction.technique
+        state.apply(deduction)
+
+    solved = state.solved
+    if not solved:
+        difficulty = GUESSING
+        hardest = "guessing"
+
+    return Rating(difficulty * 100 + min(steps, 99), level_of(difficulty),
+                  hardest, steps, solved)
+
+
+def rate_many(boards, processes=None, chunksize=CHUNKSIZE):
+    """Rate boards (an iterable) in a pool of processes.
+
+    See sudokulib.parallel.map_chunked() for the arguments.
+
+    Yields:
+        (board, Rating) pairs in input order.
+    """
+    return map_chunked(rate, boards, processes, chunksize)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m sudokulib.rating",
+        description="Rate the difficulty of sudokus (one line of 81 digits "
+                    "per sudoku, '.' may be used for empty fields).")
+    parser.add_argument(
+        "filename", nargs="?", default="-",
+        help="file to read (default: standard input)")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="number of processes (default: number of cpus)")
+    args = parser.parse_args(args)
+
+    f = sys.stdin if args.filename == "-" else open(args.filename)
+
+    def skip(number, error):
+        sys.stderr.write("Skipping line %d: %s\n" % (number, error))
+
+    try:
+        for board, rating in rate_many(read_boards(f, skip), args.processes):
+            print("%s %s %d %s" % (encode(board), rating.level,
+                                   rating.score, rating.hardest))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
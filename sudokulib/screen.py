@@ -1,18 +1,65 @@
+# standard imports
+from functools import partial
+from os.path import basename, exists, join
+
 # kivy imports
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.logger import Logger
-from kivy.properties import ListProperty, ObjectProperty
-from kivy.uix.screenmanager import Screen
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, \
+    ObjectProperty, StringProperty
+from kivy.uix.screenmanager import Screen, ScreenManager
 
 # sudokutools imports
 from sudokutools.sudoku import Sudoku
-from sudokutools.generate import generate
-from sudokutools.solvers import solve
-from sudokutools.solve import find_conflicts
 
 # local imports
+from sudokulib.board import ALL, INDICES, NUMBERS, PEERS, PEER_SETS, \
+    CodeParser, candidate_mask, decode, parse_code, to_board, to_sudoku
+from sudokulib.collection import Collection, import_file
+from sudokulib.constraints import ConstraintState
+from sudokulib.history import History, decode_cell, encode_cell
+from sudokulib.logic import LogicState, describe
 from sudokulib.secret import get_secret
-from sudokulib.popup import CallbackPopup
+from sudokulib.popup import CallbackPopup, CollectionPopup, \
+    FileChooserPopup, ProgressPopup
+from sudokulib.solver import SearchTimeout
+from sudokulib.task import BackgroundTask
+from sudokulib.trace import traced
+
+# time budget (in seconds) for checking custom sudokus
+CHECK_TIMEOUT = 10
+# time budget (in seconds) for computing the solution of a game
+SOLVE_TIMEOUT = 30
+# delay and time budget (in seconds) for checking custom sudokus while
+# they're edited
+LIVE_CHECK_DELAY = 0.3
+LIVE_CHECK_TIMEOUT = 2
+# imported puzzles (in user_data_dir)
+COLLECTIONFILE = "collection.puzzles"
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager, which builds registered screens on first use."""
+
+    def __init__(self, **kwargs):
+        super(LazyScreenManager, self).__init__(**kwargs)
+        self.factories = {}
+
+    def register(self, name, factory):
+        """Build a screen with factory(), once name is requested."""
+        self.factories[name] = factory
+
+    def get_screen(self, name):
+        factory = self.factories.pop(name, None)
+        if factory:
+            Logger.info("LazyScreenManager: Building screen %s." % name)
+            self.add_widget(factory())
+        return super(LazyScreenManager, self).get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.factories or \
+            super(LazyScreenManager, self).has_screen(name)
 
 
 class BaseScreen(Screen):
@@ -22,28 +69,38 @@ class BaseScreen(Screen):
         app = App.get_running_app()
         self.screens = app.screens
         app.bind(on_settings_change=self.on_settings_change)
-        # TODO: This fails for some reason.
-        # app.actions.bind(on_action=self.__on_action)
         self.config = app.config
 
     def on_settings_change(self, app, section, key, value):
         pass
 
-    def __on_action(self, manager, action):
-        if self.screens.current == self.name:
-            self.on_action(action)
-
     def on_action(self, action):
+        """Handle action (a str or a tuple of navigation actions or
+        digits, see sudokulib.action.coalesce()).
+        """
         pass
 
     def save_state(self, store):
-        """Called, when the app pauses or stops."""
+        """Called, when the app writes a snapshot of its state."""
         pass
 
     def restore_state(self, store):
         """Called, when this screen is instanciated"""
         pass
 
+    @classmethod
+    def replay(cls, store, entries):
+        """Called before restore_state() with the journal entries
+        ((key, entry) pairs), which were recorded after store was saved.
+
+        This is a classmethod, since screens may not have been built yet.
+        """
+        pass
+
+    def journal(self, key, entry):
+        """Record a change of the state saved under key."""
+        App.get_running_app().append_journal(key, entry)
+
 
 class GridScreen(BaseScreen):
     """Represents a screen with a SudokuGrid"""
@@ -54,10 +111,14 @@ class GridScreen(BaseScreen):
         super(GridScreen, self).__init__(**kwargs)
         self.grid.bind(on_field_select=self.on_field_select)
         self.grid.bind(on_field_set=self.on_field_set)
+        self.grid.bind(on_sync=self.on_grid_sync)
         self.sudoku = None
         self.orig = None
         self.solution = None
+        # mirrors the numbers displayed by the grid
+        self.constraints = ConstraintState()
 
+    @traced("GridScreen.on_field_set", "model")
     def on_field_set(self, grid, field, value):
         if isinstance(value, list):
             self.sudoku.set_candidates(*field.coords, value)
@@ -66,30 +127,131 @@ class GridScreen(BaseScreen):
             self.sudoku.set_candidates(*field.coords, (value,))
             self.sudoku.set_number(*field.coords, value)
 
-        if find_conflicts(self.sudoku, *field.coords):
-            field.add_highlight("conflicts")
-        else:
-            field.remove_highlight("conflicts")
-
+        self.update_constraints([field])
+
+    @traced("GridScreen.on_grid_sync", "highlight")
+    def on_grid_sync(self, grid, fields):
+        # the fields already show the content of self.sudoku
+        self.update_constraints(fields)
+
+    @traced("GridScreen.update_constraints", "highlight")
+    def update_constraints(self, fields):
+        """Update the constraint state and conflict highlights after the
+        content of fields has changed.
+        """
+        changed = set()
+        for field in fields:
+            x, y = field.coords
+            number = 0 if isinstance(field.content, list) else field.content
+            changed.symmetric_difference_update(
+                self.constraints.set(x + y * 9, number or 0))
+
+        for index in changed:
+            field = self.grid.fields[(index % 9, index // 9)]
+            if self.constraints.conflicts[index]:
+                field.add_highlight("conflicts")
+            else:
+                field.remove_highlight("conflicts")
+
+    @traced("GridScreen.on_field_select", "highlight")
     def on_field_select(self, grid, old, new):
-        if old:
-            for coord in self.sudoku.surrounding_of(*old.coords, include=False):
-                self.grid.fields[coord].remove_highlight("surrounding")
-        if new:
-            for coord in self.sudoku.surrounding_of(*new.coords, include=False):
-                self.grid.fields[coord].add_highlight("surrounding")
+        # only touch fields entering or leaving the surrounding fields
+        old_peers = PEER_SETS[old.coords[0] + old.coords[1] * 9] \
+            if old else frozenset()
+        new_peers = PEER_SETS[new.coords[0] + new.coords[1] * 9] \
+            if new else frozenset()
+
+        fields = self.grid.fields
+        for index in old_peers - new_peers:
+            fields[(index % 9, index // 9)].remove_highlight("surrounding")
+        for index in new_peers - old_peers:
+            fields[(index % 9, index // 9)].add_highlight("surrounding")
 
 
 class GameScreen(GridScreen):
     grid = ObjectProperty(None)
-    # slider = ObjectProperty(None)
-    # stack = ListProperty()
+    loading = BooleanProperty(False)
+    history_length = NumericProperty(0)
+    history_position = NumericProperty(0)
+    hint_text = StringProperty("")
     NUMBERS = [str(i) for i in range(10)]
 
+    def __init__(self, **kwargs):
+        super(GameScreen, self).__init__(**kwargs)
+        self.history = None
+        self.__solver = None
+        self.__hint_cells = ()
+        # pending supply request (see new_game()); results of requests
+        # from older generations are dropped
+        self.__request = None
+        self.__generation = 0
+        self.auto_candidates = \
+            self.config.get("game", "auto_candidates") == "1"
+
+        # the solution as board (None, while it's computed)
+        self.__solution = None
+        self.__incorrect = [False] * 81
+        self.highlight_incorrect = \
+            self.config.get("highlight", "incorrect") == "1"
+
+    def on_settings_change(self, app, section, key, value):
+        if section == "game" and key == "auto_candidates":
+            self.auto_candidates = \
+                self.config.get("game", "auto_candidates") == "1"
+        elif section == "highlight" and key == "incorrect":
+            self.highlight_incorrect = \
+                self.config.get("highlight", "incorrect") == "1"
+            self.__update_incorrect(INDICES)
+
+    def update_constraints(self, fields):
+        super(GameScreen, self).update_constraints(fields)
+        self.__update_incorrect(
+            [x + y * 9 for (x, y) in (field.coords for field in fields)])
+
+    def __update_incorrect(self, indices):
+        """Update the incorrect highlight of the fields at indices.
+
+        A field is incorrect, if its number differs from the solution.
+        Nothing is highlighted, while the solution is unknown or the
+        highlight is disabled.
+        """
+        solution = self.__solution
+        check = self.highlight_incorrect and solution is not None
+        numbers = self.constraints.numbers
+        incorrect = self.__incorrect
+        fields = self.grid.fields
+
+        for index in indices:
+            number = numbers[index]
+            wrong = check and number != 0 and number != solution[index]
+            if wrong != incorrect[index]:
+                incorrect[index] = wrong
+                field = fields[(index % 9, index // 9)]
+                if wrong:
+                    field.add_highlight("incorrect")
+                else:
+                    field.remove_highlight("incorrect")
+
+    def cell(self, x, y):
+        """Return the field at (x, y) encoded for the history."""
+        return encode_cell(self.sudoku[x, y], self.sudoku.get_candidates(x, y))
+
+    def cells(self):
+        return [self.cell(i % 9, i // 9) for i in range(81)]
+
+    @traced("GameScreen.on_field_set", "model")
     def on_field_set(self, grid, field, value):
+        x, y = field.coords
+        old = self.cell(x, y)
         super(GameScreen, self).on_field_set(grid, field, value)
+        self.clear_hint()
 
-        if len(list(self.sudoku.empty())) == 0 and not find_conflicts(self.sudoku):
+        deltas = [(x + y * 9, old, self.cell(x, y))]
+        if self.auto_candidates and value and not isinstance(value, list):
+            deltas.extend(self.__remove_candidate(x + y * 9, value))
+        self.__record(deltas)
+
+        if self.constraints.complete:
             winpopup = CallbackPopup(
                 title="Sudoku complete",
                 text="Congratulations, you have won!",
@@ -98,8 +260,17 @@ class GameScreen(GridScreen):
                     ("New Sudoku", self.new_game)])
             winpopup.open()
 
+    @traced("GameScreen.on_action", "action")
     def on_action(self, action):
-        if action in self.NUMBERS:
+        if self.loading:
+            return
+
+        if isinstance(action, tuple):
+            if action[0] in self.NUMBERS:
+                self.grid.toggle_selected_candidates([int(a) for a in action])
+            else:
+                self.grid.move(action)
+        elif action in self.NUMBERS:
             self.grid.toggle_selected_candidate(int(action))
         elif action == "confirm":
             self.grid.confirm_selected()
@@ -107,35 +278,296 @@ class GameScreen(GridScreen):
             self.grid.enter_selected(0)
         elif action in ("next_field", "prev_field", "next_row", "prev_row"):
             self.grid.select(action)
+        elif action == "undo":
+            self.seek(self.history.position - 1)
+        elif action == "redo":
+            self.seek(self.history.position + 1)
+        elif action == "hint":
+            self.hint()
         else:
             Logger.info("GameScreen: Unhandled action: %s" % action)
 
+    def __record(self, deltas):
+        """Record deltas as a single step in the history."""
+        deltas = self.history.record(deltas)
+        if deltas:
+            self.journal("game", {"step": [list(d) for d in deltas]})
+        self.__update_history()
+
+    def __set_candidates(self, changes):
+        """Set the candidates of several empty fields at once.
+
+        Args:
+            changes (list): (index, candidates) pairs.
+
+        Returns:
+            list: (index, old, new) deltas for the history.
+        """
+        deltas = []
+        coords = []
+        for index, candidates in changes:
+            x, y = index % 9, index // 9
+            old = self.cell(x, y)
+            self.sudoku.set_candidates(x, y, candidates)
+            deltas.append((index, old, self.cell(x, y)))
+            coords.append((x, y))
+
+        if coords:
+            self.grid.sync(self.sudoku, coords)
+        return deltas
+
+    def __remove_candidate(self, index, number):
+        """Remove number from the candidates of all peers of index."""
+        changes = []
+        for peer in PEERS[index]:
+            x, y = peer % 9, peer // 9
+            if self.sudoku[x, y]:
+                continue
+            candidates = self.sudoku.get_candidates(x, y)
+            if number in candidates:
+                changes.append((peer, [n for n in candidates if n != number]))
+
+        return self.__set_candidates(changes)
+
+    def fill_candidates(self):
+        """Set the candidates of all empty fields to the numbers, which
+        don't conflict with their row, column and box.
+        """
+        if self.loading or self.history is None:
+            return
+
+        changes = []
+        for index in INDICES:
+            if self.sudoku[index % 9, index // 9]:
+                continue
+            changes.append(
+                (index, NUMBERS[ALL & ~self.constraints.used(index)]))
+
+        self.__record(self.__set_candidates(changes))
+
+    def hint(self):
+        """Highlight the fields of the next logical deduction.
+
+        The candidates entered by the player are taken into account,
+        fields without candidates may contain any number.
+        """
+        if self.loading or self.history is None:
+            return
+
+        self.clear_hint()
+        if self.constraints.conflicting:
+            self.hint_text = "Resolve the conflicts first"
+            return
+
+        board = to_board(self.sudoku)
+        masks = []
+        for index in INDICES:
+            mask = 0
+            if not board[index]:
+                mask = candidate_mask(
+                    self.sudoku.get_candidates(index % 9, index // 9))
+            masks.append(mask or ALL)
+
+        deduction = LogicState(board, masks).find()
+        if deduction is None:
+            self.hint_text = "No hint found"
+            return
+
+        cells = set(deduction.cells)
+        cells.update(index for (index, _) in deduction.placements)
+        cells.update(index for (index, _) in deduction.eliminations)
+        self.__hint_cells = tuple(cells)
+        for index in self.__hint_cells:
+            self.grid.fields[(index % 9, index // 9)].add_highlight("hint")
+        self.hint_text = describe(deduction)
+
+    def clear_hint(self):
+        for index in self.__hint_cells:
+            self.grid.fields[(index % 9, index // 9)].remove_highlight("hint")
+        self.__hint_cells = ()
+        self.hint_text = ""
+
+    def __update_history(self):
+        # length first - the slider would clamp the position otherwise
+        self.history_length = len(self.history)
+        self.history_position = self.history.position
+
+    @traced("GameScreen.seek", "model")
+    def seek(self, position):
+        """Move to position in the history and display the result."""
+        if self.history is None:
+            return
+
+        before = self.history.position
+        coords = []
+        for index, value in self.history.seek(int(position)):
+            x, y = index % 9, index // 9
+            number, candidates = decode_cell(value)
+            self.sudoku.set_number(x, y, number)
+            self.sudoku.set_candidates(x, y, candidates)
+            coords.append((x, y))
+
+        if coords:
+            self.clear_hint()
+            self.grid.sync(self.sudoku, coords)
+        if self.history.position != before:
+            self.journal("game", {"seek": self.history.position})
+        self.__update_history()
+
+    def __state(self):
+        return {
+            "orig": self.orig.encode(include_candidates=True),
+            "sudoku": self.sudoku.encode(include_candidates=True),
+            "history": self.history.encode(),
+        }
+
     def save_state(self, store):
+        if self.orig is None:
+            return
+
+        store.put("game", **self.__state())
+
+    @classmethod
+    def replay(cls, store, entries):
+        orig = None
+        history = None
+        try:
+            game = store.get("game")
+            orig = game["orig"]
+            history = History.decode(game["history"])
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        for key, entry in entries:
+            if key != "game":
+                continue
+
+            if "new" in entry:
+                orig = entry["new"]["orig"]
+                history = History.decode(entry["new"]["history"])
+            elif history is None:
+                continue
+            elif "step" in entry:
+                history.record([tuple(delta) for delta in entry["step"]])
+            elif "seek" in entry:
+                history.seek(entry["seek"])
+
+        if orig is None or history is None:
+            return
+
+        sudoku = Sudoku()
+        for i, value in enumerate(history.cells):
+            number, candidates = decode_cell(value)
+            sudoku.set_number(i % 9, i // 9, number)
+            sudoku.set_candidates(i % 9, i // 9, candidates)
+
         store.put(
-            "game",
-            orig=self.orig.encode(include_candidates=True),
-            sudoku=self.sudoku.encode(include_candidates=True))
+            "game", orig=orig, sudoku=sudoku.encode(include_candidates=True),
+            history=history.encode())
 
     def restore_state(self, store):
         try:
-            orig = Sudoku.decode(store.get("game")["orig"])
-            sudoku = Sudoku.decode(store.get("game")["sudoku"])
-            self.new_game(orig, sudoku)
+            game = store.get("game")
+            orig = Sudoku.decode(game["orig"])
+            sudoku = Sudoku.decode(game["sudoku"])
         except KeyError:
             self.new_game()
+            return
+
+        try:
+            history = History.decode(game["history"])
+        except (KeyError, TypeError, ValueError):
+            history = None
+
+        self.new_game(orig, sudoku, history)
 
-    def new_game(self, orig=None, sudoku=None):
+    def new_game(self, orig=None, sudoku=None, history=None):
         if orig is None or sudoku is None:
-            self.orig = generate()
-            self.sudoku = self.orig.copy()
-        else:
-            self.orig = orig
-            self.sudoku = sudoku
-        self.solution = solve(self.sudoku)
+            if self.loading:
+                return
+            app = App.get_running_app()
+            callback = partial(self.__on_generated, self.__generation)
+            if app.bank:
+                pair = app.bank.draw(self.config.get("game", "difficulty"))
+                if pair:
+                    callback(*pair)
+                    return
+            if not app.supply.request(callback):
+                Logger.info("GameScreen: No sudoku in stock, generating.")
+                self.__request = callback
+                self.loading = True
+            return
+
+        # show the game now and attach the solution, once it's ready
+        self.__start_game(orig, sudoku, None, history)
+        self.__solve_in_background()
+
+    def __solve_in_background(self):
+        board = to_board(self.orig)
+        cache = App.get_running_app().cache
+
+        def work(task):
+            return cache.solve(
+                board, timeout=SOLVE_TIMEOUT,
+                cancelled=lambda: task.cancelled)
+
+        def on_error(error):
+            Logger.warning("GameScreen: Solving failed: %r" % error)
+
+        self.__solver = BackgroundTask(
+            work, on_result=self.__on_solved, on_error=on_error)
+        self.__solver.start()
+
+    def __on_solved(self, board):
+        if board is None:
+            Logger.warning("GameScreen: Sudoku has no solution.")
+            return
+        self.solution = to_sudoku(board)
+        self.__solution = board
+        self.__update_incorrect(INDICES)
+        self.on_solution()
+
+    def on_solution(self):
+        """Called, when self.solution has been computed."""
+        pass
+
+    def __on_generated(self, generation, puzzle, solution):
+        if generation != self.__generation:
+            Logger.info("GameScreen: Dropped a sudoku requested for an "
+                        "older game.")
+            return
+        self.__start_game(puzzle, puzzle.copy(), solution)
+
+    def __start_game(self, orig, sudoku, solution, history=None):
+        if self.__solver:
+            self.__solver.cancel()
+            self.__solver = None
+
+        # a game started another way supersedes a pending request
+        if self.__request:
+            App.get_running_app().supply.cancel(self.__request)
+            self.__request = None
+        self.__generation += 1
+        self.loading = False
+
+        self.clear_hint()
+        self.orig = orig
+        self.sudoku = sudoku
+        self.solution = solution
+        self.__solution = to_board(solution) if solution else None
         self.grid.sync(self.sudoku)
+        self.__update_incorrect(INDICES)
         self.grid.lock_filled_fields(self.orig)
         self.grid.select(None)
 
+        # discard histories, which don't lead to the restored sudoku
+        cells = self.cells()
+        if history is None or history.cells != cells:
+            history = History(cells)
+        self.history = history
+        self.__update_history()
+        self.journal("game", {"new": self.__state()})
+
 
 class MenuScreen(BaseScreen):
     pass
@@ -143,18 +575,121 @@ class MenuScreen(BaseScreen):
 
 class CustomScreen(GridScreen):
     code_input = ObjectProperty(None)
+    status_text = StringProperty("")
     NUMBERS = [str(i) for i in range(10)]
 
+    def __init__(self, **kwargs):
+        super(CustomScreen, self).__init__(**kwargs)
+        self.task = None
+        self.parser = CodeParser()
+        self.__checker = None
+        self.__trigger_check = Clock.create_trigger(
+            self._check_solvable, LIVE_CHECK_DELAY)
+        self.code_input.bind(text=self.on_code_text)
+
+    @traced("CustomScreen.on_field_set", "model")
+    def on_field_set(self, grid, field, value):
+        super(CustomScreen, self).on_field_set(grid, field, value)
+        x, y = field.coords
+        self.journal("custom", {"set": [x, y, self.sudoku[x, y]]})
+
+    @traced("CustomScreen.on_grid_sync", "model")
+    def on_grid_sync(self, grid, fields):
+        super(CustomScreen, self).on_grid_sync(grid, fields)
+        self.journal("custom", {"sudoku": self.sudoku.encode()})
+
+    def update_constraints(self, fields):
+        super(CustomScreen, self).update_constraints(fields)
+        # edits of the code are applied to the numbers in the grid, no
+        # matter, if they were entered via the code or not
+        board = self.parser.board
+        for field in fields:
+            x, y = field.coords
+            board[x + y * 9] = self.constraints.numbers[x + y * 9]
+        self.__update_status()
+
+    def on_code_text(self, code_input, text):
+        # only the fields, whose characters changed, are applied
+        self.__apply_numbers(self.parser.update(text))
+
     def update_from_code_input(self):
-        s = get_secret(self.code_input.text)
-        if s:
-            self.sudoku = Sudoku.from_str(s)
+        """Apply the whole code (or the secret it unlocks) to the grid."""
+        secret = get_secret(self.code_input.text)
+        board = decode(secret) if secret else parse_code(self.code_input.text)
+        self.__apply_numbers(list(enumerate(board)))
+
+    def __apply_numbers(self, changes):
+        """Set the numbers of fields and sync the fields, which changed.
+
+        Args:
+            changes (list): (index, number) pairs.
+        """
+        coords = []
+        for index, number in changes:
+            x, y = index % 9, index // 9
+            if self.sudoku[x, y] == number:
+                continue
+            self.sudoku.set_number(x, y, number)
+            self.sudoku.set_candidates(x, y, (number, ) if number else ())
+            coords.append((x, y))
+
+        if coords:
+            self.grid.sync(self.sudoku, coords)
+
+    def __update_status(self):
+        if self.__checker:
+            self.__checker.cancel()
+            self.__checker = None
+
+        if self.constraints.conflicting:
+            self.status_text = "%d conflicting fields" % (
+                self.constraints.conflicting)
         else:
-            self.sudoku = Sudoku.from_str(self.code_input.text)
-        self.grid.sync(self.sudoku)
-
+            self.status_text = "Checking..."
+            self.__trigger_check()
+
+    def _check_solvable(self, dt):
+        if self.constraints.conflicting or self.__checker:
+            return
+
+        board = to_board(self.sudoku)
+        cache = App.get_running_app().cache
+
+        def work(task):
+            count = cache.count_solutions(
+                board, limit=2, timeout=LIVE_CHECK_TIMEOUT,
+                cancelled=lambda: task.cancelled)
+            # the difficulty is only meaningful for unique sudokus
+            rating = cache.rate(board) if count == 1 else None
+            return count, rating
+
+        def on_result(result):
+            self.__checker = None
+            count, rating = result
+            if rating:
+                self.status_text = "Unique solution (%s)" % rating.level
+            else:
+                self.status_text = ("No solution", "Unique solution",
+                                    "Multiple solutions")[count]
+
+        def on_error(error):
+            self.__checker = None
+            if not isinstance(error, SearchTimeout):
+                Logger.error("CustomScreen: Check failed: %s" % error)
+            self.status_text = "Too hard to check"
+
+        self.__checker = BackgroundTask(
+            work, on_result=on_result, on_error=on_error).start()
+
+    @traced("CustomScreen.on_action", "action")
     def on_action(self, action, **kwargs):
-        if action in self.NUMBERS:
+        if isinstance(action, tuple):
+            # only the last of several digits stays in the field
+            if action[0] in self.NUMBERS:
+                self.grid.enter_selected(int(action[-1]))
+            else:
+                self.grid.move(action)
+        elif action in self.NUMBERS:
             self.grid.enter_selected(int(action))
             # self.grid.index += 1 <- make this an option?
         elif action == "delete":
@@ -168,15 +703,58 @@ class CustomScreen(GridScreen):
             Logger.info("CustomScreen: Unhandled action: %s" % action)
 
     def play(self):
-        unique = SudokuAnalyzer.is_unique(self.sudoku)
-        if unique is None:
+        if self.task and self.task.running:
+            return
+
+        board = to_board(self.sudoku)
+        popup = ProgressPopup(
+            title="Checking Sudoku",
+            text="Counting solutions of your Sudoku...",
+            on_cancel=self.__cancel_task)
+        cache = App.get_running_app().cache
+
+        def work(task):
+            return cache.count_solutions(
+                board, limit=2, timeout=CHECK_TIMEOUT,
+                cancelled=lambda: task.cancelled, progress=task.report)
+
+        def on_result(count):
+            popup.dismiss()
+            self.__on_checked(count)
+
+        def on_error(error):
+            popup.dismiss()
+            self.__on_checked(None, error)
+
+        self.task = BackgroundTask(
+            work, on_result=on_result, on_error=on_error,
+            on_progress=popup.set_progress)
+        popup.open()
+        self.task.start()
+
+    def __cancel_task(self):
+        if self.task:
+            self.task.cancel()
+
+    def __on_checked(self, count, error=None):
+        if error is not None:
+            if not isinstance(error, SearchTimeout):
+                Logger.error("CustomScreen: Check failed: %s" % error)
+            popup = CallbackPopup(
+                title="Sudoku could not be checked",
+                text="Your Sudoku is too hard to check.",
+                callbacks=[
+                    ("Let me fix that.", lambda: None),
+                    ("Play anyway!", self._transfer_to_game)])
+            popup.open()
+        elif count == 0:
             popup = CallbackPopup(
                 title="Sudoku cannot be solved",
                 text="Your Sudoku cannot be solved.",
                 callbacks=[
                     ("Too bad, let me fix that.", lambda: None)])
             popup.open()
-        elif unique is False:
+        elif count > 1:
             popup = CallbackPopup(
                 title="Sudoku is not unique",
                 text="Your Sudoku has multiple solutions.",
@@ -195,16 +773,152 @@ class CustomScreen(GridScreen):
         self.grid.sync(self.sudoku)
 
     def make_unique(self):
-        sol1 = self.sudoku.copy()
-        Bruteforce.call(sol1)
-        sol2 = self.sudoku.copy()
-        Bruteforce.call(sol2, reverse=True)
-        SudokuGenerator.fix_non_unique(self.sudoku, sol1, sol2)
-        self.grid.sync(self.sudoku)
+        if self.task and self.task.running:
+            return
+
+        board = to_board(self.sudoku)
+        popup = ProgressPopup(
+            title="Making Sudoku unique",
+            text="Adding numbers to your Sudoku...",
+            on_cancel=self.__cancel_task)
+        cache = App.get_running_app().cache
+
+        def work(task):
+            return cache.make_unique(
+                board, timeout=CHECK_TIMEOUT,
+                cancelled=lambda: task.cancelled, progress=task.report)
+
+        def on_result(givens):
+            popup.dismiss()
+            self.__on_made_unique(givens)
+
+        def on_error(error):
+            popup.dismiss()
+            self.__on_made_unique(None, error)
+
+        self.task = BackgroundTask(
+            work, on_result=on_result, on_error=on_error,
+            on_progress=popup.set_progress)
+        popup.open()
+        self.task.start()
+
+    def __on_made_unique(self, givens, error=None):
+        if error is not None:
+            if not isinstance(error, SearchTimeout):
+                Logger.error("CustomScreen: Make unique failed: %s" % error)
+            popup = CallbackPopup(
+                title="Sudoku could not be made unique",
+                text="Your Sudoku is too hard to make unique.",
+                callbacks=[("Let me fix that.", lambda: None)])
+            popup.open()
+        elif givens is None:
+            popup = CallbackPopup(
+                title="Sudoku cannot be solved",
+                text="Your Sudoku cannot be solved.",
+                callbacks=[
+                    ("Too bad, let me fix that.", lambda: None)])
+            popup.open()
+        elif givens:
+            coords = [(i % 9, i // 9) for (i, _) in givens]
+            for (x, y), (_, number) in zip(coords, givens):
+                self.sudoku.set_number(x, y, number)
+            self.grid.sync(self.sudoku, coords)
+
+    def __collection_file(self):
+        return join(App.get_running_app().user_data_dir, COLLECTIONFILE)
+
+    def browse(self):
+        """Open the imported puzzles."""
+        filename = self.__collection_file()
+        collection = None
+        if exists(filename):
+            try:
+                collection = Collection(filename)
+            except (IOError, OSError, ValueError) as e:
+                Logger.error("CustomScreen: Can't open collection: %s" % e)
+
+        popup = CollectionPopup(
+            collection, title="Collection",
+            on_select=lambda board: self.__apply_numbers(
+                list(enumerate(board))),
+            on_import=self.choose_import)
+        if collection:
+            popup.bind(on_dismiss=lambda popup: collection.close())
+        popup.open()
+
+    def choose_import(self):
+        popup = FileChooserPopup(
+            title="Import puzzles (SDM or SDK file)",
+            on_select=self.import_collection)
+        popup.open()
+
+    def import_collection(self, source):
+        """Import the puzzles in the file source into the collection."""
+        if self.task and self.task.running:
+            return
+
+        filename = self.__collection_file()
+        popup = ProgressPopup(
+            title="Importing puzzles",
+            text="Importing %s..." % basename(source),
+            on_cancel=self.__cancel_task)
+
+        def work(task):
+            return import_file(
+                source, filename, cancelled=lambda: task.cancelled,
+                progress=task.report)
+
+        def on_result(result):
+            popup.dismiss()
+            if result is None:
+                return
+            done = CallbackPopup(
+                title="Import finished",
+                text="%d puzzles imported\n%d duplicates, %d invalid" % (
+                    tuple(result)),
+                callbacks=[("Browse", self.browse), ("Close", lambda: None)])
+            done.open()
+
+        def on_error(error):
+            popup.dismiss()
+            Logger.error("CustomScreen: Import failed: %s" % error)
+            failed = CallbackPopup(
+                title="Import failed",
+                text="%s could not be imported." % basename(source),
+                callbacks=[("Close", lambda: None)])
+            failed.open()
+
+        self.task = BackgroundTask(
+            work, on_result=on_result, on_error=on_error,
+            on_progress=popup.set_progress)
+        popup.open()
+        self.task.start()
 
     def save_state(self, store):
         store.put("custom", sudoku=self.sudoku.encode())
 
+    @classmethod
+    def replay(cls, store, entries):
+        try:
+            sudoku = Sudoku.decode(store.get("custom")["sudoku"])
+        except KeyError:
+            sudoku = Sudoku()
+
+        changed = False
+        for key, entry in entries:
+            if key != "custom":
+                continue
+
+            changed = True
+            if "sudoku" in entry:
+                sudoku = Sudoku.decode(entry["sudoku"])
+            elif "set" in entry:
+                x, y, number = entry["set"]
+                sudoku.set_number(x, y, number)
+
+        if changed:
+            store.put("custom", sudoku=sudoku.encode())
+
     def restore_state(self, store):
         try:
             self.sudoku = Sudoku.decode(store.get("custom")["sudoku"])
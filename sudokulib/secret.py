@@ -7,7 +7,7 @@ from hashlib import sha1
 def get_secret(s):
     """Return a sudoku string if s is a valid secret or None
     """
-    key = sha1(s).hexdigest()
+    key = sha1(s.encode("utf-8")).hexdigest()
     return SECRETS.get(key, None)
 
 
@@ -0,0 +1,269 @@
+"""Module that provides a fast backtracking solver for sudoku boards.
+
+The solver works on boards (see sudokulib.board) and keeps the numbers
+used in every row, column and box as bitmasks. It always continues with
+the empty field that has the fewest candidates left (minimum remaining
+values), which finds solutions (or dead ends) of sparse boards quickly.
+
+The search can be limited to a number of solutions, aborted after a
+time budget or cancelled from another thread and it reports an estimate
+of its progress.
+
+Usage:
+
+    count = count_solutions(board, limit=2)
+    if count == 0:
+        print("unsolvable")
+    elif count == 1:
+        print("unique")
+    else:
+        print("multiple solutions")
+"""
+
+import time
+
+from sudokulib.board import ALL, BOX_OF, COLUMN_OF, INDICES, NUMBERS, \
+    POPCOUNT, ROW_OF
+
+# number of search steps between checks for timeout and cancellation
+CHECK_INTERVAL = 512
+
+
+class SearchAborted(Exception):
+    """Raised, if a search has been aborted."""
+    pass
+
+
+class SearchTimeout(SearchAborted):
+    """Raised, if a search exceeds its time budget."""
+    pass
+
+
+class SearchCancelled(SearchAborted):
+    """Raised, if a search has been cancelled."""
+    pass
+
+
+class Search(object):
+    def __init__(self, board, timeout=None, cancelled=None, progress=None):
+        """Prepare a search for the solutions of board.
+
+        Args:
+            board (list):       The board to solve (not modified).
+            timeout (float):    Time budget in seconds (None for no limit).
+            cancelled (function): Returns True, if the search should stop.
+            progress (function):  Called with the estimated fraction
+                                  (0.0 - 1.0) of the searched space.
+        """
+        self.board = list(board)
+        self.solutions = []
+        self.steps = 0
+        self.valid = True
+
+        self.__deadline = None if timeout is None else time.time() + timeout
+        self.__cancelled = cancelled
+        self.__progress = progress
+        self.__limit = 0
+
+        self.__rows = [0] * 9
+        self.__columns = [0] * 9
+        self.__boxes = [0] * 9
+        self.__empty = []
+
+        for i in INDICES:
+            number = self.board[i]
+            if not number:
+                self.__empty.append(i)
+                continue
+
+            bit = 1 << number
+            r, c, b = ROW_OF[i], COLUMN_OF[i], BOX_OF[i]
+            if (self.__rows[r] | self.__columns[c] | self.__boxes[b]) & bit:
+                self.valid = False
+            self.__rows[r] |= bit
+            self.__columns[c] |= bit
+            self.__boxes[b] |= bit
+
+    def run(self, limit=2):
+        """Search for up to limit solutions and return them.
+
+        Raises:
+            SearchTimeout:   if the time budget is exceeded.
+            SearchCancelled: if cancelled() returned True.
+        """
+        self.__limit = limit
+        if self.valid and len(self.solutions) < limit:
+            self.__search(1.0, 0.0)
+        return self.solutions
+
+    def __check(self, done):
+        if self.__cancelled and self.__cancelled():
+            raise SearchCancelled()
+        if self.__deadline is not None and time.time() > self.__deadline:
+            raise SearchTimeout()
+        if self.__progress:
+            self.__progress(done)
+
+    def __search(self, weight, done):
+        self.steps += 1
+        if not self.steps % CHECK_INTERVAL:
+            self.__check(done)
+
+        board = self.board
+        rows, columns, boxes = self.__rows, self.__columns, self.__boxes
+
+        # find the empty field with the fewest candidates
+        best = -1
+        best_mask = 0
+        best_count = 10
+        for i in self.__empty:
+            if board[i]:
+                continue
+            mask = ALL & ~(rows[ROW_OF[i]] | columns[COLUMN_OF[i]] |
+                           boxes[BOX_OF[i]])
+            count = POPCOUNT[mask]
+            if count < best_count:
+                if not count:
+                    return False
+                best, best_mask, best_count = i, mask, count
+                if count == 1:
+                    break
+
+        if best < 0:
+            self.solutions.append(list(board))
+            return len(self.solutions) >= self.__limit
+
+        r, c, b = ROW_OF[best], COLUMN_OF[best], BOX_OF[best]
+        share = weight / best_count
+
+        for k, number in enumerate(NUMBERS[best_mask]):
+            bit = 1 << number
+            board[best] = number
+            rows[r] |= bit
+            columns[c] |= bit
+            boxes[b] |= bit
+
+            stop = self.__search(share, done + k * share)
+
+            rows[r] &= ~bit
+            columns[c] &= ~bit
+            boxes[b] &= ~bit
+            board[best] = 0
+
+            if stop:
+                return True
+
+        return False
+
+
+def find_solutions(board, limit=2, **kwargs):
+    """Return a list of up to limit solutions of board.
+
+    Keyword arguments are passed to Search.
+    """
+    return Search(board, **kwargs).run(limit)
+
+
+def count_solutions(board, limit=2, **kwargs):
+    """Return the number of solutions of board (but at most limit).
+
+    Keyword arguments are passed to Search.
+    """
+    return len(find_solutions(board, limit, **kwargs))
+
+
+def solve_board(board, **kwargs):
+    """Return a solution of board or None, if there is none."""
+    solutions = find_solutions(board, 1, **kwargs)
+    return solutions[0] if solutions else None
+
+
+def make_unique(board, pool_size=16, progress=None, timeout=None,
+                **kwargs):
+    """Return the givens, which make board unique.
+
+    One solution of board (the target) is kept, while other solutions
+    are enumerated in small pools. Givens from the target are added
+    greedily at the field, where most of the known other solutions
+    differ from the target. Solutions not matching an added given are
+    dropped from the pool, so the board is only searched again, once
+    the pool is exhausted. Finally, added givens made redundant by later
+    ones are removed again.
+
+    Args:
+        board (list):     The board to make unique (not modified).
+        pool_size (int):  Number of other solutions searched at once.
+        progress (function): Called with the estimated fraction of work.
+        timeout (float):  Time budget in seconds for all searches
+                          together (None for no limit).
+
+    Other keyword arguments are passed to Search.
+
+    Returns:
+        list: (index, number) pairs of the givens to add
+              (empty, if board is unique already) or None, if board
+              has no solution.
+
+    Raises:
+        SearchTimeout:  if the time budget is exceeded.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    def search(limit):
+        # every search gets the time left of the budget
+        if deadline is None:
+            return find_solutions(work, limit, **kwargs)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise SearchTimeout()
+        return find_solutions(work, limit, timeout=remaining, **kwargs)
+
+    work = list(board)
+    solutions = search(pool_size + 1)
+    if not solutions:
+        return None
+
+    target = solutions[0]
+    others = solutions[1:]
+    added = []
+    empty = len([i for i in INDICES if not work[i]])
+
+    while True:
+        if not others:
+            others = [solution for solution in search(pool_size + 1)
+                      if solution != target]
+            if not others:
+                break
+
+        best = -1
+        best_count = 0
+        for i in INDICES:
+            if work[i]:
+                continue
+            count = 0
+            number = target[i]
+            for solution in others:
+                if solution[i] != number:
+                    count += 1
+            if count > best_count:
+                best, best_count = i, count
+
+        work[best] = target[best]
+        added.append(best)
+        others = [solution for solution in others
+                  if solution[best] == target[best]]
+
+        if progress:
+            progress(min(0.9, float(len(added)) / empty))
+
+    for i in list(added):
+        work[i] = 0
+        if len(search(2)) == 1:
+            added.remove(i)
+        else:
+            work[i] = target[i]
+
+    if progress:
+        progress(1.0)
+
+    return [(i, target[i]) for i in added]
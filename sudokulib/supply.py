@@ -0,0 +1,163 @@
+"""Module that keeps a supply of ready-made sudokus.
+
+Generating a sudoku (and solving it afterwards) takes a noticeable amount
+of time, which freezes the app if it's done in the kivy event loop.
+The PuzzleSupply keeps a bounded queue of (puzzle, solution) pairs, which
+is filled by a background thread. Whenever a pair is taken from the queue,
+the thread starts refilling it.
+
+Usage:
+
+    supply = PuzzleSupply(size=3)
+    supply.start()
+
+    # callback(puzzle, solution) is called immediately, if a pair is
+    # available or from the main thread as soon as one has been generated.
+    supply.request(callback)
+
+    supply.stop()
+
+Note: A thread (and not a process pool) is used, because it works on every
+platform kivy supports (including Android). Generation still competes with
+the main thread for the GIL, but the UI stays responsive.
+"""
+
+from collections import deque
+from functools import partial
+import threading
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+from sudokutools.generate import generate
+from sudokutools.solvers import solve
+
+# seconds to wait after a failed generation (doubled after every further
+# failure up to MAX_RETRY_DELAY)
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+def generate_pair():
+    """Generate a new sudoku and return it together with its solution."""
+    puzzle = generate()
+    return puzzle, solve(puzzle)
+
+
+class PuzzleSupply(object):
+    def __init__(self, size=3, factory=generate_pair):
+        """Create a new (stopped) supply.
+
+        Args:
+            size (int):         Maximum number of pairs kept in stock.
+            factory (function): Function returning a new (puzzle, solution)
+                                pair. Called from the worker thread.
+        """
+        self.size = size
+        self.__factory = factory
+        self.__pairs = deque()
+        self.__callbacks = deque()
+        self.__condition = threading.Condition()
+        self.__stopped = True
+        self.__thread = None
+
+    def start(self):
+        """Start the worker thread, if it's not already running."""
+        with self.__condition:
+            if not self.__stopped:
+                return
+            self.__stopped = False
+
+        self.__thread = threading.Thread(
+            target=self.__run, name="PuzzleSupply")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        """Stop the worker thread after the current generation."""
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify_all()
+
+    def __len__(self):
+        with self.__condition:
+            return len(self.__pairs)
+
+    def get(self):
+        """Return a (puzzle, solution) pair or None, if the queue is empty.
+        """
+        with self.__condition:
+            try:
+                pair = self.__pairs.popleft()
+            except IndexError:
+                return None
+            self.__condition.notify_all()
+            return pair
+
+    def request(self, callback):
+        """Call callback(puzzle, solution) with the next available pair.
+
+        If a pair is in stock, callback is called immediately. Otherwise
+        it is called from the main thread, once the worker thread has
+        generated a new pair.
+
+        Returns:
+            bool: True, if callback has been called immediately.
+        """
+        with self.__condition:
+            try:
+                pair = self.__pairs.popleft()
+            except IndexError:
+                self.__callbacks.append(callback)
+                self.__condition.notify_all()
+                return False
+            self.__condition.notify_all()
+
+        callback(*pair)
+        return True
+
+    def cancel(self, callback):
+        """Remove callback from the pending requests (if present)."""
+        with self.__condition:
+            try:
+                self.__callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def __deliver(self, callback, pair, *args):
+        callback(*pair)
+
+    def __run(self):
+        Logger.info("PuzzleSupply: Worker started.")
+        delay = RETRY_DELAY
+
+        while True:
+            with self.__condition:
+                while not self.__stopped and not self.__callbacks and \
+                        len(self.__pairs) >= self.size:
+                    self.__condition.wait()
+                if self.__stopped:
+                    break
+
+            try:
+                pair = self.__factory()
+            except Exception as e:
+                Logger.exception(
+                    "PuzzleSupply: Generation failed (retrying in %.0f "
+                    "seconds): %s" % (delay, e))
+                # back off, but wake up on stop()
+                with self.__condition:
+                    if not self.__stopped:
+                        self.__condition.wait(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                continue
+            delay = RETRY_DELAY
+
+            with self.__condition:
+                if self.__callbacks:
+                    callback = self.__callbacks.popleft()
+                    Clock.schedule_once(partial(self.__deliver, callback, pair))
+                else:
+                    self.__pairs.append(pair)
+
+        Logger.info("PuzzleSupply: Worker stopped.")
@@ -0,0 +1,171 @@
+"""Module that maps boards to a canonical form.
+
+Relabeling the digits, permuting the bands (and the rows within a band),
+permuting the stacks (and the columns within a stack) and transposing
+turn a board into an equivalent one: it has the same number of solutions
+(transformed the same way) and the same difficulty. The canonical form
+of a board is the lexicographically smallest board (read row by row,
+empty fields first), which is equivalent to it, so equivalent boards
+have the same canonical form.
+
+The canonical form is searched row by row (branch and bound): only the
+transformations producing the smallest rows so far are continued. Boards
+with very few numbers have huge numbers of such transformations, so the
+search gives up after MAX_STATES of them (canonical_form() returns None).
+
+Usage:
+
+    canonical, transform = canonical_form(board)
+    solution = transform.revert(solve_board(canonical))
+"""
+
+from collections import namedtuple
+from itertools import permutations, product
+
+from sudokulib.board import INDICES
+
+# maximum number of partial transformations followed at once
+MAX_STATES = 20000
+
+ORDERS = tuple(permutations(range(3)))
+STACKS = ((0, 1, 2), (3, 4, 5), (6, 7, 8))
+
+
+class Transform(namedtuple("TransformTuple", ["cells", "digits"])):
+    """A transformation of a board into its canonical form.
+
+    Attributes:
+        cells (tuple):  cells[i] is the index of the field moved to i.
+        digits (tuple): digits[n] is the label of number n (0 stays 0).
+    """
+
+    def apply(self, board):
+        """Return board transformed."""
+        digits = self.digits
+        return [digits[board[i]] for i in self.cells]
+
+    def revert(self, board):
+        """Return the board, which is transformed into board."""
+        numbers = [0] * 10
+        for number, label in enumerate(self.digits):
+            numbers[label] = number
+
+        result = [0] * 81
+        for i, cell in zip(INDICES, self.cells):
+            result[cell] = numbers[board[i]]
+        return result
+
+
+def column_orders(row):
+    """Return the column orders, which move the numbers in row as far
+    to the right as possible.
+    """
+    counts = [len([c for c in stack if row[c]]) for stack in STACKS]
+    inner = [[empty + filled
+              for empty in permutations([c for c in stack if not row[c]])
+              for filled in permutations([c for c in stack if row[c]])]
+             for stack in STACKS]
+
+    orders = []
+    for a, b, c in ORDERS:
+        if counts[a] <= counts[b] <= counts[c]:
+            orders.extend(x + y + z
+                          for x, y, z in product(inner[a], inner[b], inner[c]))
+    return tuple(sorted(counts)), orders
+
+
+def label_row(row, columns, labels):
+    """Return the labeled numbers of row in the order of columns.
+
+    Numbers without a label get the next free one (labels is updated).
+    """
+    result = []
+    for c in columns:
+        number = row[c]
+        if number:
+            label = labels[number]
+            if not label:
+                label = labels[number] = labels[0] + 1
+                labels[0] = label
+            result.append(label)
+        else:
+            result.append(0)
+    return tuple(result)
+
+
+def next_rows(rows, k):
+    """Return the rows allowed as row k after rows (source row indices)."""
+    if k % 3:
+        band = rows[k - 1] // 3
+        return [r for r in range(band * 3, band * 3 + 3) if r not in rows]
+
+    used = set(r // 3 for r in rows)
+    return [r for r in range(9) if r // 3 not in used]
+
+
+def canonical_form(board, max_states=MAX_STATES):
+    """Return (canonical board, Transform) of board or None, if the
+    search exceeds max_states.
+    """
+    grids = (
+        tuple(tuple(board[r * 9 + c] for c in range(9)) for r in range(9)),
+        tuple(tuple(board[c * 9 + r] for c in range(9)) for r in range(9)),
+    )
+
+    # first row: only the positions of the numbers matter
+    best = None
+    starts = []
+    for g, grid in enumerate(grids):
+        for r in range(9):
+            key, orders = column_orders(grid[r])
+            if best is None or key < best:
+                best = key
+                starts = []
+            if key == best:
+                starts.append((g, r, orders))
+
+    if sum(len(orders) for (_, _, orders) in starts) > max_states:
+        return None
+
+    # states: (grid, source rows, column order, labels (labels[0] is the
+    # last label used))
+    states = []
+    prefix = []
+    for g, r, orders in starts:
+        for columns in orders:
+            labels = [0] * 10
+            row = label_row(grids[g][r], columns, labels)
+            states.append((g, (r, ), columns, labels))
+    prefix.append(row)
+
+    for k in range(1, 9):
+        best = None
+        following = []
+        for g, rows, columns, labels in states:
+            grid = grids[g]
+            for r in next_rows(rows, k):
+                new_labels = list(labels)
+                row = label_row(grid[r], columns, new_labels)
+                if best is None or row < best:
+                    best = row
+                    following = []
+                if row == best:
+                    following.append((g, rows + (r, ), columns, new_labels))
+                    if len(following) > max_states:
+                        return None
+
+        states = following
+        prefix.append(best)
+
+    g, rows, columns, labels = states[0]
+    # numbers missing in board get the remaining labels
+    free = iter(range(labels[0] + 1, 10))
+    digits = [0] + [labels[n] or next(free) for n in range(1, 10)]
+
+    if g == 0:
+        cells = tuple(rows[i // 9] * 9 + columns[i % 9] for i in INDICES)
+    else:
+        cells = tuple(columns[i % 9] * 9 + rows[i // 9] for i in INDICES)
+
+    canonical = [n for row in prefix for n in row]
+    return canonical, Transform(cells, tuple(digits))
@@ -0,0 +1,107 @@
+"""Module that runs functions in a background thread.
+
+A BackgroundTask calls a function in a separate thread and reports its
+result, errors and progress back to the kivy main thread, so long running
+computations don't stall the frame loop.
+
+Usage:
+
+    def work(task):
+        for i in range(100):
+            if task.cancelled:
+                return None
+            task.report(i / 100.0)
+        return "done"
+
+    task = BackgroundTask(
+        work,
+        on_result=lambda result: print(result),
+        on_progress=lambda progress: print(progress))
+    task.start()
+
+    # Callbacks won't be called anymore after cancel().
+    task.cancel()
+"""
+
+from functools import partial
+import threading
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+
+class BackgroundTask(object):
+    def __init__(self, func, on_result=None, on_error=None, on_progress=None):
+        """Create a new task.
+
+        Args:
+            func (function):        Called as func(task) in the worker thread.
+            on_result (function):   Called with the return value of func.
+            on_error (function):    Called with the exception raised by func.
+            on_progress (function): Called with the values passed to report().
+
+        All callbacks are called from the main thread and never after
+        the task has been cancelled.
+        """
+        self.__func = func
+        self.__on_result = on_result
+        self.__on_error = on_error
+        self.__on_progress = on_progress
+        self.__cancelled = threading.Event()
+        self.__progress = None
+        self.__progress_scheduled = False
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+    @property
+    def cancelled(self):
+        return self.__cancelled.is_set()
+
+    @property
+    def running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+        return self
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def report(self, progress):
+        """Report progress from the worker thread.
+
+        Reports are coalesced: on_progress is called at most once per
+        frame with the latest value.
+        """
+        with self.__lock:
+            self.__progress = progress
+            if self.__progress_scheduled or not self.__on_progress:
+                return
+            self.__progress_scheduled = True
+        Clock.schedule_once(self._deliver_progress)
+
+    def _deliver_progress(self, *args):
+        with self.__lock:
+            progress = self.__progress
+            self.__progress_scheduled = False
+        if not self.cancelled:
+            self.__on_progress(progress)
+
+    def __deliver(self, callback, value, *args):
+        if callback and not self.cancelled:
+            callback(value)
+
+    def __run(self):
+        try:
+            result = self.__func(self)
+        except Exception as e:
+            if not self.cancelled:
+                if not self.__on_error:
+                    Logger.exception("BackgroundTask: %s" % e)
+                Clock.schedule_once(partial(self.__deliver, self.__on_error, e))
+            return
+
+        Clock.schedule_once(partial(self.__deliver, self.__on_result, result))
@@ -0,0 +1,107 @@
+"""Module that traces the time spent between input and rendering.
+
+Tracing is enabled by setting the environment variable SUDOKU_TRACE to
+the name of the trace file, e.g.:
+
+    SUDOKU_TRACE=trace.json python main.py
+
+When enabled, functions decorated with traced() are timed and frame
+times are recorded (see SudokuApp.on_start). The trace is written on
+exit in the Chrome trace format (open it in chrome://tracing or
+https://ui.perfetto.dev) and a summary of the slowest handlers is
+logged.
+
+When disabled, traced() returns the decorated function itself, so
+tracing costs nothing.
+
+Usage:
+
+    from sudokulib import trace
+
+    class MyWidget(Widget):
+        @trace.traced("MyWidget.on_touch_down", "input")
+        def on_touch_down(self, touch):
+            pass
+"""
+
+from collections import deque
+from functools import wraps
+import json
+import os
+import threading
+import time
+
+TRACE_FILE = os.environ.get("SUDOKU_TRACE", "")
+enabled = bool(TRACE_FILE)
+# number of events kept (older events are dropped)
+MAX_EVENTS = 500000
+
+
+def now():
+    """Return the current time in microseconds."""
+    return time.perf_counter() * 1e6
+
+
+class Tracer(object):
+    def __init__(self):
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.pid = os.getpid()
+
+    def add(self, name, category, start, duration):
+        """Record a complete event (times in microseconds)."""
+        self.events.append({
+            "name": name, "cat": category, "ph": "X",
+            "ts": start, "dur": duration,
+            "pid": self.pid, "tid": threading.current_thread().ident,
+        })
+
+    def wrap(self, func, name, category):
+        """Return func wrapped to record an event for every call."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = now()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, category, start, now() - start)
+        return wrapper
+
+    def frame(self, dt):
+        """Record a frame, which ended now and took dt seconds."""
+        end = now()
+        self.add("frame", "frame", end - dt * 1e6, dt * 1e6)
+
+    def export(self, filename):
+        """Write the events to filename in the Chrome trace format."""
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": list(self.events),
+                       "displayTimeUnit": "ms"}, f)
+
+    def summary(self, count=10):
+        """Return the slowest handlers as list of
+        (name, calls, mean, max) tuples (times in milliseconds).
+        """
+        stats = {}
+        for event in self.events:
+            if event["cat"] == "frame":
+                continue
+            calls, total, longest = stats.get(event["name"], (0, 0.0, 0.0))
+            stats[event["name"]] = (
+                calls + 1, total + event["dur"], max(longest, event["dur"]))
+
+        rows = [(name, calls, total / calls / 1000.0, longest / 1000.0)
+                for name, (calls, total, longest) in stats.items()]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows[:count]
+
+
+tracer = Tracer() if enabled else None
+
+
+def traced(name, category="handler"):
+    """Decorator, which records every call of the function as event."""
+    def decorator(func):
+        if not enabled:
+            return func
+        return tracer.wrap(func, name, category)
+    return decorator